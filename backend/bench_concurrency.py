@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Concurrent throughput of /execute before and after the asyncio executor.
+Uses a fake M2 that sleeps FAKE_M2_DELAY seconds, so no Macaulay2 install is needed.
+
+    python bench_concurrency.py --requests 20 --delay 0.5
+"""
+
+import argparse
+import asyncio
+import subprocess
+import tempfile
+import time
+
+from executor import run_m2, set_resource_limits
+from fake_m2 import fake_m2_on_path
+
+CODE = "2+2"
+
+
+async def blocking_execute(code: str):
+    # What execute_code did before: subprocess.run inside an async handler
+    with tempfile.TemporaryDirectory() as temp_dir:
+        return subprocess.run(
+            ['M2', '--stop'],
+            input=code + "\nexit\n",
+            cwd=temp_dir,
+            capture_output=True,
+            text=True,
+            timeout=35,
+            preexec_fn=set_resource_limits,
+        )
+
+
+async def async_execute(code: str):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        return await run_m2(code, cwd=temp_dir)
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Worst delay of a 10ms ticker, a stand-in for how long /health would wait"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run_benchmark(execute, requests: int) -> dict:
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(execute(CODE) for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return {
+        "wall_seconds": elapsed,
+        "throughput_rps": requests / elapsed,
+        "max_loop_lag_seconds": await lag_task,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--delay', type=float, default=0.5, help='Fake M2 run time in seconds')
+    args = parser.parse_args()
+
+    with fake_m2_on_path(FAKE_M2_DELAY=args.delay):
+        for name, execute in [("blocking subprocess.run", blocking_execute), ("asyncio executor", async_execute)]:
+            result = asyncio.run(run_benchmark(execute, args.requests))
+            print(f"{name:25s} wall={result['wall_seconds']:.2f}s "
+                  f"throughput={result['throughput_rps']:.1f} req/s "
+                  f"max_loop_lag={result['max_loop_lag_seconds'] * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Cold start and peak memory of a fully preloaded M2 against a lean `--no-preload` M2 that loads only the packages each snippet uses.
+Every run starts a fresh process, so the numbers are what a pool refill pays per slot.
+
+    python bench_lean_startup.py --runs 10
+    python bench_lean_startup.py --runs 10 --fake   # without Macaulay2 installed
+"""
+
+import argparse
+import asyncio
+
+from bench_strategies import CORPUS, summarize
+from executor import M2_COMMAND
+from fake_m2 import fake_m2_on_path
+from m2_execution_methods import FreshProcessStrategy
+from packages import LEAN_COMMAND, PackageIndex
+
+# Answers the index query and starts faster with --no-preload, like the real thing
+FAKE_LEAN_M2_SCRIPT = """#!/bin/sh
+if [ "$1" = "--version" ]; then
+    echo "1.0-fake"
+    exit 0
+fi
+input=$(cat)
+case "$input" in
+    *@@symbol*)
+        echo "@@symbol Saturation saturate"
+        echo "@@symbol PrimaryDecomposition primaryDecomposition"
+        exit 0;;
+esac
+case " $* " in
+    *" --no-preload "*) sleep "${FAKE_M2_LEAN_DELAY:-0.1}";;
+    *) sleep "${FAKE_M2_DELAY:-0.5}";;
+esac
+echo "i1 : 2+2"
+echo
+echo "o1 = 4"
+"""
+
+
+async def run_benchmark(runs: int, timeout: float) -> dict:
+    index = PackageIndex()
+    if not await index.build():
+        raise SystemExit("Could not build the package index; is this M2 able to start with --no-preload?")
+    full = FreshProcessStrategy(M2_COMMAND)
+    lean = FreshProcessStrategy(LEAN_COMMAND)
+    report = {}
+    for workload, code in CORPUS.items():
+        preamble = index.preamble(code)
+        lean_code = f"{preamble}\n{code}" if preamble else code
+        report[("full", workload)] = summarize([await full.execute(code, timeout) for _ in range(runs)])
+        report[("lean", workload)] = summarize([await lean.execute(lean_code, timeout) for _ in range(runs)])
+        report[("lean", workload)]["packages"] = ", ".join(index.required(code)) or "-"
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=10, help='Runs per startup mode and workload')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--fake', action='store_true', help='Use a fake M2 whose lean start is faster')
+    args = parser.parse_args()
+
+    if args.fake:
+        with fake_m2_on_path(FAKE_LEAN_M2_SCRIPT):
+            report = asyncio.run(run_benchmark(args.runs, args.timeout))
+    else:
+        report = asyncio.run(run_benchmark(args.runs, args.timeout))
+
+    print(f"{'mode':5s} {'workload':16s} {'p50':>7s} {'p95':>7s} {'startup':>8s} {'rss MB':>8s} fails  packages")
+    for (mode, workload), row in report.items():
+        print(f"{mode:5s} {workload:16s} {row['p50']:7.3f} {row['p95']:7.3f} {row['startup_p50']:8.3f} "
+              f"{row['peak_rss_mb']:8.1f} {row['failures']:5d}  {row.get('packages', '')}")
+
+
+if __name__ == "__main__":
+    main()
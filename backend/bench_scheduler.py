@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Latency of short and long jobs under a mixed load, with and without the runtime-predicting fast lane.
+Jobs are simulated with sleeps of their true runtime, so only the scheduler is measured. The
+predictor starts cold and learns from the runs, as it would after a restart. One snippet looks
+cheap but is not, to show demotion.
+
+    python bench_scheduler.py --jobs 300 --slots 4 --rate 6
+"""
+
+import argparse
+import asyncio
+import random
+
+from predictor import RuntimePredictor
+from scheduler import FairScheduler, percentiles
+
+# (code, true runtime in seconds, share of the load)
+WORKLOAD = [
+    ("2+2", 0.02, 0.48),
+    ("R = QQ[x,y,z]\nI = ideal(x^2, y^2, z^2)\nhilbertSeries I", 0.1, 0.2),
+    ("M = matrix{{1,2},{3,4}}\ndet M", 0.02, 0.15),
+    ("R = ZZ/101[x_1..x_8]\nI = ideal(random(R^1, R^{4:-2}))\nres I", 3.0, 0.1),
+    ("R = QQ[a..f]\nprimaryDecomposition ideal(a*b - c*d, e*f - a^2, b^3)", 5.0, 0.04),
+    # Cheap-looking, but the loop runs for a while
+    ("s = 0\nfor i to 10^7 do s = s + i\ns", 2.0, 0.03),
+]
+SHORT = 1.0
+
+
+async def run(scheduler: FairScheduler, jobs: list[tuple[float, str, float]]) -> dict[str, list[float]]:
+    loop = asyncio.get_running_loop()
+    latencies = {"short": [], "long": []}
+
+    async def job(code: str, runtime: float):
+        start = loop.time()
+        async with scheduler.slot(f"client-{random.randrange(50)}", code):
+            await asyncio.sleep(runtime)
+        latencies["short" if runtime <= SHORT else "long"].append(loop.time() - start)
+
+    start = loop.time()
+    tasks = []
+    for arrival, code, runtime in jobs:
+        await asyncio.sleep(max(0.0, start + arrival - loop.time()))
+        tasks.append(asyncio.create_task(job(code, runtime)))
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+def workload(jobs: int, rate: float, seed: int) -> list[tuple[float, str, float]]:
+    rng = random.Random(seed)
+    arrival = 0.0
+    result = []
+    for _ in range(jobs):
+        arrival += rng.expovariate(rate)
+        code, runtime, _ = rng.choices(WORKLOAD, weights=[share for *_, share in WORKLOAD])[0]
+        result.append((arrival, code, runtime))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--jobs', type=int, default=300)
+    parser.add_argument('--slots', type=int, default=4, help='Concurrent executions')
+    parser.add_argument('--rate', type=float, default=6.0, help='Arrivals per second')
+    parser.add_argument('--fast-lane-slots', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    jobs = workload(args.jobs, args.rate, args.seed)
+    configurations = [
+        ("fair FIFO", {}),
+        ("predicted fast lane", {"predictor": RuntimePredictor(10_000), "fast_lane_slots": args.fast_lane_slots,
+                                 "fast_lane_seconds": SHORT}),
+    ]
+    for name, options in configurations:
+        scheduler = FairScheduler(args.slots, max_queue=10_000, max_queue_per_client=10_000,
+                                  max_wait_seconds=600, **options)
+        latencies = asyncio.run(run(scheduler, jobs))
+        short, long = percentiles(latencies["short"]), percentiles(latencies["long"])
+        print(f"{name:20s} short p50={short['p50']:.2f}s p95={short['p95']:.2f}s  "
+              f"long p50={long['p50']:.2f}s p95={long['p95']:.2f}s  demoted={scheduler.demoted}")
+        if scheduler.predictor:
+            print(f"{'':20s} prediction {scheduler.predictor.stats()}")
+
+
+if __name__ == "__main__":
+    main()
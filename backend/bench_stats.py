@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Per-request overhead of the stats middleware with a year of history loaded.
+Compares the old save-on-every-request behaviour with the batched StatsStore.
+
+    python bench_stats.py --requests 10000 --days 365 --users-per-day 300
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+import main as api
+from stats_store import StatsStore
+
+
+def make_history(days: int, users_per_day: int) -> dict:
+    start = datetime.utcnow() - timedelta(days=days)
+    history = {'requests_per_day': {}, 'unique_users_per_day': {}}
+    for offset in range(days):
+        date_str = (start + timedelta(days=offset)).strftime('%Y-%m-%d')
+        history['requests_per_day'][date_str] = users_per_day * 5
+        history['unique_users_per_day'][date_str] = [f"10.0.{i // 256}.{i % 256}" for i in range(users_per_day)]
+    return history
+
+
+def make_request(i: int) -> Request:
+    return Request({
+        "type": "http", "method": "GET", "path": "/health", "headers": [],
+        "client": (f"192.168.{i % 50}.{i % 200}", 1234),
+    })
+
+
+async def call_next(request):
+    return Response()
+
+
+def old_middleware_factory(stats_file: str, history: dict):
+    # The middleware as it was: update the sets, then dump everything to disk
+    stats_lock = threading.Lock()
+    stats = {
+        'requests_per_day': dict(history['requests_per_day']),
+        'unique_users_per_day': {k: set(v) for k, v in history['unique_users_per_day'].items()},
+    }
+
+    async def middleware(request, call_next):
+        date_str = datetime.utcnow().strftime('%Y-%m-%d')
+        ip = request.client.host
+        with stats_lock:
+            stats['requests_per_day'][date_str] = stats['requests_per_day'].get(date_str, 0) + 1
+            stats['unique_users_per_day'].setdefault(date_str, set()).add(ip)
+        with stats_lock:
+            stats_copy = {
+                'requests_per_day': stats['requests_per_day'],
+                'unique_users_per_day': {k: list(v) for k, v in stats['unique_users_per_day'].items()},
+            }
+        with open(stats_file, 'w') as f:
+            json.dump(stats_copy, f)
+        return await call_next(request)
+
+    return middleware
+
+
+async def time_requests(middleware, requests: int) -> float:
+    start = time.perf_counter()
+    for i in range(requests):
+        await middleware(make_request(i), call_next)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=10_000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--users-per-day', type=int, default=300)
+    args = parser.parse_args()
+
+    history = make_history(args.days, args.users_per_day)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        old = old_middleware_factory(os.path.join(temp_dir, "old_stats.json"), history)
+        old_seconds = asyncio.run(time_requests(old, args.requests))
+
+        stats_file = os.path.join(temp_dir, "stats.json")
+        with open(stats_file, 'w') as f:
+            json.dump(history, f)
+        api.stats_store = StatsStore(os.path.join(temp_dir, "stats.db"), flush_interval=10, legacy_files=(stats_file,))
+        import_start = time.perf_counter()
+        api.stats_store.load()
+        import_seconds = time.perf_counter() - import_start
+        new_seconds = asyncio.run(time_requests(api.stats_middleware, args.requests))
+        flush_start = time.perf_counter()
+        api.stats_store.flush()
+        flush_seconds = time.perf_counter() - flush_start
+
+    for name, seconds in [("save on every request", old_seconds), ("batched StatsStore", new_seconds)]:
+        print(f"{name:22s} total={seconds:.2f}s per_request={seconds / args.requests * 1e6:.0f}us")
+    print(f"importing {args.days} days of history took {import_seconds * 1000:.0f}ms, "
+          f"flushing took {flush_seconds * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Write overhead of the shared SQLite StatsStore with 1..16 worker processes on one database.
+Each worker records requests and flushes every --flush-every of them, as the background
+flush would; the totals read back afterwards must equal the sum over all workers.
+
+    python bench_stats_workers.py --requests 20000 --flush-every 500
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from scheduler import percentiles
+from stats_store import StatsStore
+
+DAYS = ("2025-01-01", "2025-01-02")
+
+
+def worker(db_file: str, index: int, requests: int, flush_every: int, users: int, results):
+    store = StatsStore(db_file, flush_interval=10)
+    store.load()
+    record_seconds = 0.0
+    flush_seconds = []
+    for i in range(requests):
+        start = time.perf_counter()
+        store.record(DAYS[i % len(DAYS)], f"10.{index}.{(i % users) // 256}.{i % 256}")
+        record_seconds += time.perf_counter() - start
+        if (i + 1) % flush_every == 0:
+            start = time.perf_counter()
+            store.flush()
+            flush_seconds.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    store.flush()
+    flush_seconds.append(time.perf_counter() - start)
+    results.put((record_seconds, flush_seconds))
+
+
+def run(workers: int, requests: int, flush_every: int, users: int) -> dict:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = os.path.join(temp_dir, "stats.db")
+        StatsStore(db_file, flush_interval=10).load()
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=worker, args=(db_file, i, requests, flush_every, users, results))
+            for i in range(workers)
+        ]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        snapshot = StatsStore(db_file, flush_interval=10)
+        snapshot.load()
+        totals = snapshot.snapshot()
+
+    flushes = [seconds for _, seconds_list in outcomes for seconds in seconds_list]
+    return {
+        "wall_seconds": elapsed,
+        "record_us": sum(r for r, _ in outcomes) / (workers * requests) * 1e6,
+        "flush_ms": {k: v * 1000 for k, v in percentiles(flushes).items()},
+        "requests_ok": sum(totals['requests_per_day'].values()) == workers * requests,
+        "unique_estimate": totals['unique_users_total'],
+        "unique_true": workers * min(users, requests),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=20_000, help='Requests recorded per worker')
+    parser.add_argument('--flush-every', type=int, default=500)
+    parser.add_argument('--users', type=int, default=1000, help='Distinct IPs per worker')
+    parser.add_argument('--workers', type=int, nargs='*', default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    print(f"{'workers':>7s} {'wall s':>7s} {'record us':>9s} {'flush p50':>9s} {'p95':>7s} {'p99':>7s} "
+          f"{'counts':>6s} {'unique est/true':>16s}")
+    for workers in args.workers:
+        row = run(workers, args.requests, args.flush_every, args.users)
+        flush = row['flush_ms']
+        print(f"{workers:7d} {row['wall_seconds']:7.2f} {row['record_us']:9.1f} {flush['p50']:7.2f}ms "
+              f"{flush['p95']:5.2f}ms {flush['p99']:5.2f}ms {'exact' if row['requests_ok'] else 'WRONG':>6s} "
+              f"{row['unique_estimate']:>7d}/{row['unique_true']:<8d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Latency, startup overhead and peak memory of every M2 execution strategy over a corpus of workloads.
+Prints p50/p95/p99 per strategy and workload and the M2_EXECUTION_STRATEGY with the best p95.
+
+    python bench_strategies.py --runs 20
+    python bench_strategies.py --runs 20 --strategies pool stdin --fake   # without Macaulay2 installed
+"""
+
+import argparse
+import asyncio
+
+from fake_m2 import fake_m2_on_path
+from m2_execution_methods import build_strategies
+from pool import M2Pool
+from scheduler import percentiles
+
+CORPUS = {
+    "ring_setup": "R = QQ[x,y,z,w]\nS = R/ideal(x*y - z*w)\nS",
+    "groebner_basis": "R = QQ[a..f]\nI = ideal(a*b - c*d, b*c - d*e, c*d - e*f, a^3 - f^3)\ngens gb I",
+    "resolution": "R = ZZ/32003[a..e]\nI = ideal(a*b, b*c, c*d, d*e, e*a)\nC = res I\nbetti C",
+    "big_output": "R = QQ[x_1..x_12]\nm = genericMatrix(R, 3, 4)\nexteriorPower(2, m)",
+}
+
+
+def summarize(results) -> dict:
+    latency = percentiles([r.spawn_seconds + r.wall_seconds for r in results])
+    startup = percentiles([r.spawn_seconds + (r.first_byte_seconds or 0) for r in results])
+    return {
+        **latency,
+        "startup_p50": startup["p50"],
+        "peak_rss_mb": max(r.peak_rss_bytes for r in results) / 1e6,
+        "failures": sum(r.returncode != 0 for r in results),
+    }
+
+
+async def run_benchmark(names: list[str], runs: int, timeout: float) -> dict:
+    pool = M2Pool(min_size=2, max_size=4, refill_per_second=4, max_idle_seconds=600, health_check_interval=5)
+    await pool.start()
+    # Give the pool a moment to warm up, as it would be in production
+    await asyncio.sleep(1)
+    strategies = build_strategies(pool)
+    report = {}
+    try:
+        for name in names:
+            for workload, code in CORPUS.items():
+                results = []
+                for _ in range(runs):
+                    results.append(await strategies[name].execute(code, timeout))
+                report[(name, workload)] = summarize(results)
+    finally:
+        await pool.stop()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=20, help='Runs per strategy and workload')
+    parser.add_argument('--strategies', nargs='*', default=None, help='Subset of strategies to compare')
+    parser.add_argument('--timeout', type=float, default=35)
+    parser.add_argument('--fake', action='store_true', help='Use a fake M2 that sleeps FAKE_M2_DELAY seconds')
+    parser.add_argument('--delay', type=float, default=0.2, help='Fake M2 run time in seconds')
+    args = parser.parse_args()
+    names = args.strategies or list(build_strategies(None))
+
+    if args.fake:
+        with fake_m2_on_path(FAKE_M2_DELAY=args.delay):
+            report = asyncio.run(run_benchmark(names, args.runs, args.timeout))
+    else:
+        report = asyncio.run(run_benchmark(names, args.runs, args.timeout))
+
+    print(f"{'strategy':14s} {'workload':16s} {'p50':>7s} {'p95':>7s} {'p99':>7s} {'startup':>8s} {'rss MB':>8s} fails")
+    for (name, workload), row in report.items():
+        print(f"{name:14s} {workload:16s} {row['p50']:7.3f} {row['p95']:7.3f} {row['p99']:7.3f} "
+              f"{row['startup_p50']:8.3f} {row['peak_rss_mb']:8.1f} {row['failures']:5d}")
+
+    # Strategies that failed a workload cannot be recommended, whatever their latency
+    worst_p95 = {}
+    for (name, _), row in report.items():
+        worst_p95[name] = float('inf') if row['failures'] else max(worst_p95.get(name, 0), row['p95'])
+    best = min(worst_p95, key=worst_p95.get)
+    print(f"\nLowest worst-case p95: M2_EXECUTION_STRATEGY={best}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Bytes on the wire and serialization CPU of /execute responses in every encoding the backend can send.
+Covers a typical small result, an error, and a worst case near the spill threshold: a large
+whitespace-aligned matrix.
+
+    python bench_wire.py --repeat 50
+"""
+
+import argparse
+import json
+import random
+import time
+
+from wire import compress, pack_msgpack, msgpack, zstandard
+
+BANNER = ("Macaulay2, version 1.24.05\n"
+          "with packages: ConwayPolynomials, Elimination, IntegralClosure, InverseSystems, Isomorphism,\n"
+          "               LLLBases, MinimalPrimes, OnlineLookup, PrimaryDecomposition, ReesAlgebra,\n"
+          "               Saturation, TangentCone, Truncations, Varieties\n")
+
+
+def response(stdout: str, stderr: str = "", error_message: str | None = None) -> dict:
+    return {
+        "stdout": stdout, "stderr": stderr, "success": error_message is None, "error_message": error_message,
+        "cached": False, "cells": None, "output_handle": None, "output_bytes": None, "output_truncated": False,
+    }
+
+
+def matrix_output(rows: int, columns: int) -> str:
+    random.seed(1)
+    entries = [[f"{random.randint(-999, 999)}*x_{random.randint(1, 12)}^{random.randint(1, 4)}"
+                for _ in range(columns)] for _ in range(rows)]
+    width = max(len(entry) for row in entries for entry in row)
+    lines = ["      | " + " ".join(entry.ljust(width) for entry in row) + " |" for row in entries]
+    return (f"i1 : m = random(R^{rows}, R^{{{columns}:-2}})\n\n"
+            "o1 = " + "\n".join(lines).lstrip() +
+            f"\n\n             {rows}       {columns}\no1 : Matrix R  <--- R\n\ni2 : exit\n")
+
+
+WORKLOADS = {
+    "typical": response("i1 : R = QQ[x,y,z]\n\no1 = R\n\no1 : PolynomialRing\n\n"
+                        "i2 : I = ideal(x^2 + y^2, z^2)\n\n              2    2   2\n"
+                        "o2 = ideal (x  + y , z )\n\no2 : Ideal of R\n\ni3 : exit\n"),
+    "error": response("i1 : R = QQ[x]\n\no1 = R\n\no1 : PolynomialRing\n\ni2 : ",
+                      BANNER + "stdio:2:5:(3): error: no method for binary operator + applied to objects:\n"
+                      "--            x (of class R)\n--      +     \"a\" (of class String)\n",
+                      "Macaulay2 error:\nstdio:2:5:(3): error: no method for binary operator + applied to objects:"),
+    "worst_case": response(matrix_output(1400, 8)),
+}
+
+
+def encodings():
+    yield "json", lambda r: json.dumps(r).encode('utf-8')
+    yield "json+gzip", lambda r: compress(json.dumps(r).encode('utf-8'), "gzip")
+    if zstandard:
+        yield "json+zstd", lambda r: compress(json.dumps(r).encode('utf-8'), "zstd")
+    if msgpack:
+        yield "msgpack", pack_msgpack
+        yield "msgpack+gzip", lambda r: compress(pack_msgpack(r), "gzip")
+        if zstandard:
+            yield "msgpack+zstd", lambda r: compress(pack_msgpack(r), "zstd")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=50, help='Serializations timed per encoding and workload')
+    args = parser.parse_args()
+    if not (msgpack and zstandard):
+        print("msgpack or zstandard is not installed, skipping those encodings\n")
+
+    print(f"{'workload':11s} {'encoding':13s} {'bytes':>9s} {'ratio':>6s} {'cpu ms':>8s}")
+    for workload, body in WORKLOADS.items():
+        baseline = len(json.dumps(body).encode('utf-8'))
+        for name, encode in encodings():
+            size = len(encode(body))
+            start = time.process_time()
+            for _ in range(args.repeat):
+                encode(body)
+            cpu_ms = (time.process_time() - start) / args.repeat * 1000
+            print(f"{workload:11s} {name:13s} {size:9d} {baseline / size:6.1f} {cpu_ms:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
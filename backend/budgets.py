@@ -0,0 +1,57 @@
+import heapq
+import time
+from collections import OrderedDict
+
+
+class CpuBudgets:
+    """
+    A token bucket of CPU seconds per client, holding up to `capacity` seconds and
+    refilling at `refill_per_second`. Runs are charged their measured CPU time after
+    they finish, so a balance can go negative, and the client stays over budget until
+    it has refilled. Buckets are kept per process in LRU order; past `max_clients` the
+    least recently seen client is forgotten and starts again with a full bucket.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float, max_clients: int = 100_000):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_clients = max_clients
+        # client -> [balance, last refill, CPU seconds used, runs]
+        self._buckets: OrderedDict[str, list] = OrderedDict()
+
+    def over_budget(self, client: str) -> bool:
+        bucket = self._buckets.get(client)
+        return bucket is not None and self._refill(bucket, time.monotonic()) <= 0
+
+    def charge(self, client: str, cpu_seconds: float):
+        now = time.monotonic()
+        bucket = self._buckets.pop(client, None)
+        if bucket is None:
+            bucket = [self.capacity, now, 0.0, 0]
+        self._refill(bucket, now)
+        bucket[0] -= cpu_seconds
+        bucket[2] += cpu_seconds
+        bucket[3] += 1
+        self._buckets[client] = bucket
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+
+    def top(self, limit: int) -> list[dict]:
+        """Clients by CPU seconds used since this process started, with what is left of their budget"""
+        now = time.monotonic()
+        heaviest = heapq.nlargest(limit, self._buckets.items(), key=lambda item: item[1][2])
+        return [
+            {
+                "client": client,
+                "cpu_seconds": round(bucket[2], 3),
+                "runs": bucket[3],
+                "balance_seconds": round(self._refill(bucket, now), 3),
+                "over_budget": bucket[0] <= 0,
+            }
+            for client, bucket in heaviest
+        ]
+
+    def _refill(self, bucket: list, now: float) -> float:
+        bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_per_second)
+        bucket[1] = now
+        return bucket[0]
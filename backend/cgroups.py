@@ -0,0 +1,164 @@
+import logging
+import os
+import secrets
+import subprocess
+import time
+
+logger = logging.getLogger(__name__)
+
+CPU_PERIOD_USEC = 100_000
+CONTROLLERS = ("memory", "cpu", "pids")
+
+
+def read_keyed(path: str) -> dict[str, int]:
+    """Parse a flat-keyed cgroup file such as cpu.stat or memory.events"""
+    values = {}
+    with open(path) as f:
+        for line in f:
+            key, _, value = line.partition(' ')
+            if value.strip().isdigit():
+                values[key] = int(value)
+    return values
+
+
+class Cgroup:
+    """The cgroup v2 directory of one M2 process tree"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.procs_file = os.path.join(path, "cgroup.procs")
+
+    def cpu_seconds(self) -> float:
+        return read_keyed(os.path.join(self.path, "cpu.stat")).get("usage_usec", 0) / 1e6
+
+    def usage(self) -> tuple[float, int, bool]:
+        """CPU seconds, peak memory in bytes and whether the OOM killer fired"""
+        cpu = self.cpu_seconds()
+        try:
+            with open(os.path.join(self.path, "memory.peak")) as f:
+                peak = int(f.read())
+        except (FileNotFoundError, ValueError):
+            # memory.peak needs Linux 5.19; the /proc sampling in the executor covers older kernels
+            peak = 0
+        oom_killed = read_keyed(os.path.join(self.path, "memory.events")).get("oom_kill", 0) > 0
+        return cpu, peak, oom_killed
+
+    def contains(self, pid: int) -> bool:
+        try:
+            with open(self.procs_file) as f:
+                return str(pid) in f.read().split()
+        except OSError:
+            return False
+
+    def kill(self):
+        """Kill every process in the group, including any that left the process group"""
+        try:
+            with open(os.path.join(self.path, "cgroup.kill"), 'w') as f:
+                f.write("1")
+        except OSError:
+            pass
+
+    def remove(self):
+        # Killed tasks leave the group asynchronously, so give them a moment
+        for _ in range(50):
+            try:
+                os.rmdir(self.path)
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                time.sleep(0.01)
+        logger.warning(f"Could not remove cgroup {self.path}, it will be swept later")
+
+
+class CgroupSandbox:
+    """
+    Puts each M2 process tree in its own cgroup v2 under `root`, with memory.max,
+    cpu.max and pids.max, so limits apply to real memory and to the job rather than
+    to address space and the whole UID. `root` has to be delegated to this service
+    (systemd `Delegate=yes`, or a directory chowned to its user) with the memory,
+    cpu and pids controllers available.
+    """
+
+    def __init__(self, root: str, memory_max_bytes: int, cpu_max_cores: float, pids_max: int):
+        self.root = root
+        self.memory_max_bytes = memory_max_bytes
+        self.cpu_max_cores = cpu_max_cores
+        self.pids_max = pids_max
+
+    def available(self) -> bool:
+        """Prepare `root` for per-job groups; False (with the reason logged) when cgroups can't be used"""
+        try:
+            parent = os.path.dirname(self.root.rstrip('/'))
+            if not os.path.exists(os.path.join(parent, "cgroup.controllers")):
+                raise OSError(f"{parent} is not a cgroup v2 directory")
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, "cgroup.controllers")) as f:
+                missing = set(CONTROLLERS) - set(f.read().split())
+            if missing:
+                raise OSError(f"controllers {', '.join(sorted(missing))} are not delegated to {self.root}")
+            with open(os.path.join(self.root, "cgroup.subtree_control"), 'w') as f:
+                f.write(" ".join(f"+{name}" for name in CONTROLLERS))
+            self.sweep()
+            self._try_join()
+            return True
+        except OSError as e:
+            logger.warning(f"cgroup v2 sandbox unavailable, using rlimits: {e}")
+            return False
+
+    def create(self) -> Cgroup:
+        path = os.path.join(self.root, f"m2-{secrets.token_hex(8)}")
+        os.mkdir(path)
+        group = Cgroup(path)
+        try:
+            self._write(path, "memory.max", str(self.memory_max_bytes))
+            # Swapping would hide real usage and slow the whole host down
+            self._write(path, "memory.swap.max", "0")
+            self._write(path, "cpu.max", f"{int(self.cpu_max_cores * CPU_PERIOD_USEC)} {CPU_PERIOD_USEC}")
+            self._write(path, "pids.max", str(self.pids_max))
+        except OSError:
+            group.remove()
+            raise
+        return group
+
+    def _try_join(self):
+        """
+        Have a child join a group the way M2 will. Writing cgroup.procs also needs write
+        access to the common ancestor of the service's own group and `root`, so a
+        directory that merely belongs to us can still refuse it.
+        """
+        group = self.create()
+        try:
+            def join():
+                with open(group.procs_file, 'w') as f:
+                    f.write(str(os.getpid()))
+
+            try:
+                child = subprocess.Popen(["sleep", "5"], preexec_fn=join)
+            except subprocess.SubprocessError as e:
+                raise OSError(f"processes cannot be moved into {self.root}: {e}")
+            joined = group.contains(child.pid)
+            child.kill()
+            child.wait()
+            if not joined:
+                raise OSError(f"processes cannot be moved into {self.root}")
+        finally:
+            group.remove()
+
+    def sweep(self):
+        """Remove groups left behind by a crash; non-empty ones still belong to running processes"""
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and entry.name.startswith("m2-"):
+                try:
+                    os.rmdir(entry.path)
+                except OSError:
+                    pass
+
+    def _write(self, path: str, name: str, value: str):
+        try:
+            with open(os.path.join(path, name), 'w') as f:
+                f.write(value)
+        except FileNotFoundError:
+            # memory.swap.max is missing when swap accounting is off
+            if name != "memory.swap.max":
+                raise
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Checks the pre-flight syntax check against a corpus of broken and valid snippets, and with --m2 against real M2.
+Without --m2 each snippet's finding must match the expected location. With --m2 every snippet also
+runs through the installed M2: anything the pre-flight check rejects must fail in M2 too (otherwise
+strict mode would refuse working code), and M2's own error location is printed next to ours.
+Exits non-zero on any disagreement.
+
+    python check_preflight.py
+    python check_preflight.py --m2
+"""
+
+import argparse
+import asyncio
+import re
+import sys
+import tempfile
+import timeit
+
+from executor import run_m2
+from preflight import check_syntax
+
+# (code, expected "line:column" of the finding, or None for code the check must let through)
+CORPUS = [
+    ("R = QQ[x,y,z]\nI = ideal(x^2 + y^2, z^2)\nI", None),
+    ("f = x -> (x + 1)\nf(2)", None),
+    ("L = {1, (2, 3), [4]}\n#L", None),
+    ('s = "a (string) with [brackets"\ns', None),
+    ('s = "escaped \\" quote"\ns', None),
+    ("-- a comment with (\n2+2", None),
+    ("-* block comment ( spanning\n two lines *-\n3*3", None),
+    ("s = /// a block string with { ///\ns", None),
+    ("M = matrix{{1,2},{3,4}}\ndet M", None),
+    ("x = 5 -- trailing comment ]\nx", None),
+    ("R = QQ[x,y\nI = ideal(x)", "1:7"),
+    ("f(1, 2", "1:2"),
+    ("ideal(x^2, y]", "1:13"),
+    ("2 + 3)", "1:6"),
+    ("M = matrix{{1,2},{3,4}\ndet M", "1:11"),
+    ('s = "never closed\ns', "1:5"),
+    ("-* comment without end\n2+2", "1:1"),
+    ("s = /// block string without end\ns", "1:5"),
+    ("L = {1, 2, 3}}", "1:14"),
+    ("apply(1..3, i -> (i, i^2)", "1:6"),
+]
+
+LOCATION = re.compile(r'^stdio:(\d+):(\d+):')
+
+
+def finding_location(error: str | None) -> str | None:
+    match = LOCATION.match(error) if error else None
+    return f"{match.group(1)}:{match.group(2)}" if match else None
+
+
+async def m2_error(code: str) -> tuple[bool, str | None]:
+    with tempfile.TemporaryDirectory() as workdir:
+        result = await run_m2(code, workdir)
+    for line in result.stderr.splitlines():
+        if LOCATION.match(line):
+            return result.returncode != 0, line.strip()
+    return result.returncode != 0, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--m2', action='store_true', help='Also run every snippet through the installed M2')
+    args = parser.parse_args()
+
+    disagreements = 0
+    for code, expected in CORPUS:
+        error = check_syntax(code)
+        found = finding_location(error)
+        ok = found == expected
+        line = (f"{'ok  ' if ok else 'FAIL'} {code.splitlines()[0][:36]:36s} "
+                f"expected {expected or '-':5s} got {found or '-':5s}")
+        if args.m2:
+            failed, m2_line = asyncio.run(m2_error(code))
+            if error and not failed:
+                ok = False
+                line += "  M2 ran it fine"
+            line += f"  M2: {m2_line or ('error' if failed else 'ok')}"
+        disagreements += not ok
+        print(line)
+
+    per_check = timeit.timeit(lambda: [check_syntax(code) for code, _ in CORPUS], number=1000) / (1000 * len(CORPUS))
+    print(f"\n{len(CORPUS)} snippets, {disagreements} disagreements, {per_check * 1e6:.1f}us per check")
+    sys.exit(1 if disagreements else 0)
+
+
+if __name__ == "__main__":
+    main()
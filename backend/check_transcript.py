@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Checks the transcript parser against M2 transcripts with 2D output, and with --m2 against real M2.
+The corpus holds transcripts as M2 prints them: matrices, modules, ideals with exponents, nets,
+Betti tables and fractions, with exponent lines above both the value and the type. Each is parsed
+whole and again fed in small random chunks, and both must give the expected cells. With --m2 the
+inputs also run through the installed M2, and every cell with a value must come back with a type.
+Exits non-zero on any disagreement.
+
+    python check_transcript.py
+    python check_transcript.py --m2
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+
+from executor import run_m2
+from transcript import TranscriptParser, parse_transcript
+
+# (transcript, expected {n: (value, type)})
+CORPUS = [
+    (
+        "i1 : matrix{{1,2},{3,4}}\n"
+        "\n"
+        "o1 = | 1 2 |\n"
+        "     | 3 4 |\n"
+        "\n"
+        "              2        2\n"
+        "o1 : Matrix ZZ  <--- ZZ\n"
+        "\n",
+        {1: ("| 1 2 |\n| 3 4 |", "         2        2\nMatrix ZZ  <--- ZZ")},
+    ),
+    (
+        "i1 : R = QQ[x,y];\n"
+        "\n"
+        "i2 : I = ideal(x^2, y^3)\n"
+        "\n"
+        "             2   3\n"
+        "o2 = ideal (x , y )\n"
+        "\n"
+        "o2 : Ideal of R\n"
+        "\n",
+        {1: (None, None), 2: ("        2   3\nideal (x , y )", "Ideal of R")},
+    ),
+    (
+        "i3 : R^2\n"
+        "\n"
+        "      2\n"
+        "o3 = R\n"
+        "\n"
+        "o3 : R-module, free\n"
+        "\n",
+        {3: (" 2\nR", "R-module, free")},
+    ),
+    (
+        "i4 : coker vars R\n"
+        "\n"
+        "o4 = cokernel | x y |\n"
+        "\n"
+        "                            1\n"
+        "o4 : R-module, quotient of R\n"
+        "\n",
+        {4: ("cokernel | x y |", "                       1\nR-module, quotient of R")},
+    ),
+    (
+        "i5 : \"a\" || \"bb\"\n"
+        "\n"
+        "o5 = a\n"
+        "     bb\n"
+        "\n"
+        "o5 : Net\n"
+        "\n",
+        {5: ("a\nbb", "Net")},
+    ),
+    (
+        "i6 : betti res I\n"
+        "\n"
+        "            0 1 2\n"
+        "o6 = total: 1 2 1\n"
+        "         0: 1 . .\n"
+        "         1: . 1 .\n"
+        "         2: . 1 1\n"
+        "\n"
+        "o6 : BettiTally\n"
+        "\n",
+        {6: ("       0 1 2\ntotal: 1 2 1\n    0: 1 . .\n    1: . 1 .\n    2: . 1 1", "BettiTally")},
+    ),
+    (
+        "i7 : hilbertSeries I\n"
+        "\n"
+        "          2    3    5\n"
+        "     1 - T  - T  + T\n"
+        "o7 = -----------------\n"
+        "              2\n"
+        "       (1 - T)\n"
+        "\n"
+        "o7 : Expression of class Divide\n"
+        "\n",
+        {7: ("     2    3    5\n1 - T  - T  + T\n-----------------\n         2\n  (1 - T)",
+             "Expression of class Divide")},
+    ),
+    (
+        "i10 : map(R^1, R^{2:-1}, {{x, y}})\n"
+        "\n"
+        "o10 = | x y |\n"
+        "\n"
+        "               1      2\n"
+        "o10 : Matrix R  <--- R\n"
+        "\n",
+        {10: ("| x y |", "         1      2\nMatrix R  <--- R")},
+    ),
+    (
+        "i8 : print \"hello\"\n"
+        "hello\n"
+        "\n"
+        "i9 : 1/0\n"
+        "stdio:9:2:(3): error: division by zero\n",
+        {8: (None, None), 9: (None, None)},
+    ),
+]
+
+# Inputs whose value M2 prints in 2D, for --m2
+M2_INPUTS = [
+    "R = QQ[x,y]",
+    "matrix{{1,2},{3,4}}",
+    "ideal(x^2, y^3)",
+    "R^2",
+    "coker vars R",
+    "\"a\" || \"bb\"",
+    "betti res ideal(x^2, y^3)",
+    "hilbertSeries ideal(x^2, y^3)",
+    "map(R^1, R^{2:-1}, {{x, y}})",
+]
+
+
+def cells_by_number(cells) -> dict:
+    return {cell.n: (cell.value, cell.type) for cell in cells}
+
+
+def chunked(transcript: str, rng: random.Random) -> dict:
+    parser = TranscriptParser()
+    cells = []
+    position = 0
+    while position < len(transcript):
+        size = rng.randint(1, 7)
+        cells += parser.feed(transcript[position:position + size])
+        position += size
+    return cells_by_number(cells + parser.finish())
+
+
+def check_m2() -> int:
+    with tempfile.TemporaryDirectory() as workdir:
+        result = asyncio.run(run_m2("\n".join(M2_INPUTS), workdir))
+    disagreements = 0
+    for cell in parse_transcript(result.stdout):
+        ok = cell.value is None or cell.type is not None
+        disagreements += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} M2 i{cell.n}: type {cell.type.splitlines()[-1] if cell.type else '-'}")
+    return disagreements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--m2', action='store_true', help='Also run 2D-printing inputs through the installed M2')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    disagreements = 0
+    for transcript, expected in CORPUS:
+        whole = cells_by_number(parse_transcript(transcript))
+        ok = whole == expected and chunked(transcript, rng) == expected
+        disagreements += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {transcript.splitlines()[0]}")
+        if not ok:
+            print(f"     expected {expected}\n     got      {whole}")
+    if args.m2:
+        disagreements += check_m2()
+
+    print(f"\n{len(CORPUS)} transcripts, {disagreements} disagreements")
+    sys.exit(1 if disagreements else 0)
+
+
+if __name__ == "__main__":
+    main()
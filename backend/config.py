@@ -0,0 +1,125 @@
+import os
+import tempfile
+
+
+def env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def env_float(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+
+# Warm pool of pre-started M2 interpreters
+POOL_MIN_SIZE = env_int("M2_POOL_MIN_SIZE", 2)
+POOL_MAX_SIZE = env_int("M2_POOL_MAX_SIZE", 8)
+POOL_REFILL_PER_SECOND = env_float("M2_POOL_REFILL_PER_SECOND", 4.0)
+POOL_MAX_IDLE_SECONDS = env_float("M2_POOL_MAX_IDLE_SECONDS", 600.0)
+POOL_HEALTH_CHECK_INTERVAL = env_float("M2_POOL_HEALTH_CHECK_INTERVAL", 5.0)
+
+# How /execute runs M2, one of the names in m2_execution_methods.build_strategies
+EXECUTION_STRATEGY = os.environ.get("M2_EXECUTION_STRATEGY", "pool")
+
+# "cgroup" runs each M2 in its own cgroup v2 under CGROUP_ROOT (needs delegation, falls back to rlimits)
+SANDBOX = os.environ.get("M2_SANDBOX", "rlimit")
+CGROUP_ROOT = os.environ.get("M2_CGROUP_ROOT", "/sys/fs/cgroup/m2-sandbox")
+CGROUP_MEMORY_MAX_BYTES = env_int("M2_CGROUP_MEMORY_MAX_BYTES", 2_000_000_000)
+CGROUP_CPU_MAX_CORES = env_float("M2_CGROUP_CPU_MAX_CORES", 1.0)
+CGROUP_PIDS_MAX = env_int("M2_CGROUP_PIDS_MAX", 50)
+
+# Start pooled M2s with --no-preload and load only the packages each snippet uses
+LEAN_STARTUP = env_int("M2_LEAN_STARTUP", 0) == 1
+
+# Pre-flight bracket/string check: "strict" answers broken code without running M2,
+# "advisory" runs it anyway and reports the finding in syntax_error, "off" skips the check
+PREFLIGHT_MODE = os.environ.get("M2_PREFLIGHT_MODE", "advisory")
+
+# Admission control in front of execution; 0 sizes concurrency from CPU count and RAM
+MAX_CONCURRENT_EXECUTIONS = env_int("M2_MAX_CONCURRENT_EXECUTIONS", 0)
+MAX_QUEUED_EXECUTIONS = env_int("M2_MAX_QUEUED_EXECUTIONS", 64)
+MAX_QUEUED_PER_CLIENT = env_int("M2_MAX_QUEUED_PER_CLIENT", 4)
+MAX_QUEUE_WAIT_SECONDS = env_float("M2_MAX_QUEUE_WAIT_SECONDS", 30.0)
+
+# Jobs predicted to finish within FAST_LANE_SECONDS are admitted first, and FAST_LANE_SLOTS
+# of the execution slots are kept for them; predictions learn from the last N distinct snippets
+FAST_LANE_SLOTS = env_int("M2_FAST_LANE_SLOTS", 1)
+FAST_LANE_SECONDS = env_float("M2_FAST_LANE_SECONDS", 1.0)
+PREDICTOR_HISTORY_SIZE = env_int("M2_PREDICTOR_HISTORY_SIZE", 10_000)
+
+# CPU budget per client IP: a bucket of CPU seconds refilling at a steady rate. Clients that
+# have used theirs up are not rejected, but queue behind everyone else and get a shorter timeout
+CPU_BUDGET_SECONDS = env_float("M2_CPU_BUDGET_SECONDS", 600.0)
+CPU_BUDGET_REFILL_PER_SECOND = env_float("M2_CPU_BUDGET_REFILL_PER_SECOND", 0.2)
+CPU_BUDGET_THROTTLED_TIMEOUT_SECONDS = env_float("M2_CPU_BUDGET_THROTTLED_TIMEOUT_SECONDS", 10.0)
+CPU_BUDGET_MAX_CLIENTS = env_int("M2_CPU_BUDGET_MAX_CLIENTS", 100_000)
+
+# Result cache for deterministic snippets; an empty directory disables the disk tier
+RESULT_CACHE_MAX_ENTRIES = env_int("M2_RESULT_CACHE_MAX_ENTRIES", 10_000)
+RESULT_CACHE_MAX_BYTES = env_int("M2_RESULT_CACHE_MAX_BYTES", 64_000_000)
+RESULT_CACHE_DIR = os.environ.get("M2_RESULT_CACHE_DIR", "")
+RESULT_CACHE_DISK_MAX_ENTRIES = env_int("M2_RESULT_CACHE_DISK_MAX_ENTRIES", 100_000)
+
+# POST /execute/batch: items per request and how many of them run at once
+BATCH_MAX_ITEMS = env_int("M2_BATCH_MAX_ITEMS", 100)
+BATCH_MAX_PARALLEL = env_int("M2_BATCH_MAX_PARALLEL", 4)
+
+# Asynchronous jobs, kept in SQLite (default: backend/jobs.db) and run by every worker process
+JOBS_DB_FILE = os.environ.get("M2_JOBS_DB_FILE", "")
+JOB_CONCURRENCY = env_int("M2_JOB_CONCURRENCY", 2)
+JOB_LONG_TIMEOUT_SECONDS = env_int("M2_JOB_LONG_TIMEOUT_SECONDS", 600)
+JOB_EXTENDED_TIMEOUT_SECONDS = env_int("M2_JOB_EXTENDED_TIMEOUT_SECONDS", 3600)
+JOB_MAX_ACTIVE_PER_CLIENT = env_int("M2_JOB_MAX_ACTIVE_PER_CLIENT", 10)
+JOB_MAX_OUTPUT_BYTES = env_int("M2_JOB_MAX_OUTPUT_BYTES", 20_000_000)
+JOB_RESULT_TTL_SECONDS = env_float("M2_JOB_RESULT_TTL_SECONDS", 86400.0)
+JOB_POLL_INTERVAL_SECONDS = env_float("M2_JOB_POLL_INTERVAL_SECONDS", 1.0)
+JOB_HEARTBEAT_INTERVAL_SECONDS = env_float("M2_JOB_HEARTBEAT_INTERVAL_SECONDS", 5.0)
+
+# Responses at least this large are gzip/zstd compressed for clients that accept it
+COMPRESSION_MIN_BYTES = env_int("M2_COMPRESSION_MIN_BYTES", 1024)
+
+# Scratch directories M2 runs in, a ring per worker on tmpfs where there is one. Without
+# the right to mount a size-limited tmpfs per workspace, a RAM-backed root is replaced by
+# a directory in the system temp dir
+WORKSPACE_ROOT = os.environ.get(
+    "M2_WORKSPACE_ROOT",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "m2-workspaces"),
+)
+WORKSPACE_SLOTS = env_int("M2_WORKSPACE_SLOTS", 16)
+WORKSPACE_QUOTA_BYTES = env_int("M2_WORKSPACE_QUOTA_BYTES", 100_000_000)
+WORKSPACE_REAP_INTERVAL_SECONDS = env_float("M2_WORKSPACE_REAP_INTERVAL_SECONDS", 60.0)
+
+# Streaming output
+STREAM_MAX_BYTES = env_int("M2_STREAM_MAX_BYTES", 10_000_000)
+
+# Outputs past the threshold spill to disk; the response carries the head and a handle for paging
+OUTPUT_SPILL_DIR = os.environ.get("M2_OUTPUT_SPILL_DIR", os.path.join(tempfile.gettempdir(), "m2-output"))
+OUTPUT_SPILL_THRESHOLD_BYTES = env_int("M2_OUTPUT_SPILL_THRESHOLD_BYTES", 1_000_000)
+OUTPUT_HEAD_BYTES = env_int("M2_OUTPUT_HEAD_BYTES", 256_000)
+OUTPUT_MAX_BYTES = env_int("M2_OUTPUT_MAX_BYTES", 100_000_000)
+OUTPUT_TTL_SECONDS = env_float("M2_OUTPUT_TTL_SECONDS", 900.0)
+OUTPUT_SWEEP_INTERVAL_SECONDS = env_float("M2_OUTPUT_SWEEP_INTERVAL_SECONDS", 60.0)
+
+# Usage statistics, shared by all workers through one SQLite database (default: backend/stats.db)
+STATS_DB_FILE = os.environ.get("M2_STATS_DB_FILE", "")
+STATS_FLUSH_INTERVAL_SECONDS = env_float("M2_STATS_FLUSH_INTERVAL_SECONDS", 10.0)
+
+# Opt-in request traces for load replay (replay.py); empty disables recording
+TRACE_FILE = os.environ.get("M2_TRACE_FILE", "")
+# Key for the code and client hashes, so neither can be recovered by hashing guesses;
+# required, traces are not recorded without it
+TRACE_HASH_KEY = os.environ.get("M2_TRACE_HASH_KEY", "")
+TRACE_FLUSH_INTERVAL_SECONDS = env_float("M2_TRACE_FLUSH_INTERVAL_SECONDS", 5.0)
+
+# Background health probe; readiness fails when the last probe is older than the max age
+HEALTH_PROBE_INTERVAL_SECONDS = env_float("M2_HEALTH_PROBE_INTERVAL_SECONDS", 30.0)
+HEALTH_PROBE_MAX_AGE_SECONDS = env_float("M2_HEALTH_PROBE_MAX_AGE_SECONDS", 120.0)
+
+# Share of runs whose stdout/stderr previews are logged, capped per minute
+PREVIEW_LOG_SAMPLE_RATE = env_float("M2_PREVIEW_LOG_SAMPLE_RATE", 0.01)
+PREVIEW_LOG_MAX_PER_MINUTE = env_int("M2_PREVIEW_LOG_MAX_PER_MINUTE", 30)
+
+# Persistent sessions, one M2 process each. They live in the worker that created them, so use a
+# single worker (or sticky routing per session) when sessions are enabled
+MAX_SESSIONS = env_int("M2_MAX_SESSIONS", 32)
+SESSION_IDLE_TTL_SECONDS = env_float("M2_SESSION_IDLE_TTL_SECONDS", 900.0)
+SESSION_SWEEP_INTERVAL_SECONDS = env_float("M2_SESSION_SWEEP_INTERVAL_SECONDS", 30.0)
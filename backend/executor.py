@@ -0,0 +1,367 @@
+import asyncio
+import logging
+import os
+import resource
+import signal
+import time
+from contextlib import aclosing
+from dataclasses import dataclass
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+M2_COMMAND = ['M2', '--stop']
+WALL_TIMEOUT_SECONDS = 35
+MEMORY_LIMIT_BYTES = 2_000_000_000
+CPU_LIMIT_SECONDS = 120
+READ_CHUNK_SIZE = 64 * 1024
+RSS_SAMPLE_INTERVAL_SECONDS = 0.1
+
+
+@dataclass
+class ExecutionResult:
+    returncode: int | None
+    stdout: str
+    stderr: str
+    timed_out: bool = False
+    spawn_seconds: float = 0.0
+    first_byte_seconds: float | None = None
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    # CPU the interpreter had used before the run (a warm slot's startup), not counted in cpu_seconds
+    cpu_baseline_seconds: float = 0.0
+    peak_rss_bytes: int = 0
+    output_bytes: int = 0
+    output_handle: str | None = None
+    output_truncated: bool = False
+    oom_killed: bool = False
+
+    @property
+    def outcome(self) -> str:
+        if self.timed_out:
+            return "timeout"
+        if self.returncode == 0:
+            return "success"
+        if self.oom_killed:
+            return "memory_limit"
+        # With equal soft and hard RLIMIT_CPU the kernel may send SIGKILL instead of SIGXCPU
+        if self.killed_by(getattr(signal, 'SIGXCPU', None)) or (
+                self.killed_by(getattr(signal, 'SIGKILL', None))
+                and self.cpu_seconds + self.cpu_baseline_seconds >= CPU_LIMIT_SECONDS - 1):
+            return "cpu_limit"
+        if self.killed_by(getattr(signal, 'SIGXFSZ', None)):
+            return "file_size_limit"
+        if 'out of memory' in self.stderr.lower():
+            return "memory_limit"
+        if self.returncode is not None and (self.returncode < 0 or self.returncode > 128):
+            return "killed"
+        return "error"
+
+    def killed_by(self, signum: int | None) -> bool:
+        # A shell wrapper around the M2 binary reports a fatal signal as 128 + signum
+        return signum is not None and self.returncode in (-signum, 128 + signum)
+
+
+def set_resource_limits(cpu_seconds: int = CPU_LIMIT_SECONDS, cgroup_procs_file: str | None = None):
+    """Set resource limits for child process (Linux/Unix only)"""
+    try:
+        if cgroup_procs_file:
+            # Memory and process count are then enforced by the job's own cgroup, on real usage
+            try:
+                with open(cgroup_procs_file, 'w') as f:
+                    f.write(str(os.getpid()))
+            except OSError:
+                cgroup_procs_file = None
+        if not cgroup_procs_file:
+            # 2GB memory limit (soft and hard)
+            resource.setrlimit(resource.RLIMIT_AS, (MEMORY_LIMIT_BYTES, MEMORY_LIMIT_BYTES))
+            # Limit number of processes
+            resource.setrlimit(resource.RLIMIT_NPROC, (50, 50))
+        # 120 second CPU time limit unless a longer job tier asks for more
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+        # Limit file size to 100MB
+        resource.setrlimit(resource.RLIMIT_FSIZE, (100_000_000, 100_000_000))
+    except (ValueError, OSError, AttributeError) as e:
+        # On Windows or if limits can't be set, just log warning
+        logger.warning(f"Could not set resource limits (this is normal on Windows): {e}")
+
+
+_sandbox = None
+_cgroups: dict = {}
+
+
+def use_sandbox(sandbox):
+    """Run every M2 started from now on in its own cgroup of `sandbox` (a `cgroups.CgroupSandbox`)"""
+    global _sandbox
+    _sandbox = sandbox
+
+
+def sandbox_mode() -> str:
+    return "cgroup" if _sandbox else "rlimit"
+
+
+async def spawn_m2(cwd: str, command: list[str] = M2_COMMAND, merge_stderr: bool = False,
+                   cpu_limit_seconds: int = CPU_LIMIT_SECONDS) -> asyncio.subprocess.Process:
+    """Start M2 in its own process group so the whole tree can be killed at once"""
+    group = _sandbox.create() if _sandbox else None
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT if merge_stderr else asyncio.subprocess.PIPE,
+            cwd=cwd,
+            preexec_fn=partial(set_resource_limits, cpu_limit_seconds, group and group.procs_file)
+            if os.name != 'nt' else None,
+            start_new_session=True,
+        )
+    except BaseException:
+        if group:
+            group.remove()
+        raise
+    if group and not group.contains(process.pid):
+        # The child fell back to rlimits; an empty group would report zero usage for it
+        logger.warning(f"M2 did not join cgroup {group.path}, running it under rlimits")
+        group.remove()
+        group = None
+    if group:
+        _cgroups[process] = group
+    return process
+
+
+async def release_sandbox(process: asyncio.subprocess.Process) -> tuple[float, int, bool] | None:
+    """
+    Kill whatever is left in the process's cgroup and remove it, returning its CPU seconds,
+    peak memory and OOM flag. None without a cgroup; safe to call more than once.
+    """
+    group = _cgroups.pop(process, None)
+    if group is None:
+        return None
+
+    def release():
+        try:
+            usage = group.usage()
+        except OSError:
+            usage = None
+        group.kill()
+        group.remove()
+        return usage
+
+    return await asyncio.to_thread(release)
+
+
+def sandbox_cpu_seconds(process: asyncio.subprocess.Process) -> float:
+    """CPU seconds used so far in the process's cgroup, 0 without one"""
+    group = _cgroups.get(process)
+    try:
+        return group.cpu_seconds() if group else 0.0
+    except OSError:
+        return 0.0
+
+
+def kill_process_group(process: asyncio.subprocess.Process):
+    group = _cgroups.get(process)
+    if group:
+        group.kill()
+    if process.returncode is not None:
+        return
+    try:
+        if os.name == 'nt':
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+async def probe_m2_version(timeout: float = 5) -> str | None:
+    """First line of `M2 --version`, or None when M2 is missing or hangs"""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            'M2', '--version', stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout)
+    except FileNotFoundError:
+        return None
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        return None
+    if process.returncode != 0:
+        return None
+    return stdout.decode('utf-8', errors='replace').strip().split('\n')[0]
+
+
+async def feed_stdin(process: asyncio.subprocess.Process, data: bytes):
+    try:
+        process.stdin.write(data)
+        await process.stdin.drain()
+        process.stdin.close()
+    except (BrokenPipeError, ConnectionResetError):
+        # M2 exited before reading everything, the exit code tells the rest
+        pass
+
+
+async def read_stream(stream: asyncio.StreamReader) -> bytes:
+    chunks = []
+    while chunk := await stream.read(READ_CHUNK_SIZE):
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def read_status_bytes(pid: int, field: str) -> int:
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def read_peak_rss(pid: int) -> int:
+    return read_status_bytes(pid, 'VmHWM:')
+
+
+def read_rss(pid: int) -> int:
+    return read_status_bytes(pid, 'VmRSS:')
+
+
+def read_cpu_seconds(pid: int) -> float:
+    """
+    User plus system CPU time a live process has used so far, with that of the children it
+    has waited for and of those still running (M2 may be a shell wrapper around the binary)
+    """
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        ticks = sum(int(field) for field in fields[11:15])
+    except (OSError, ValueError, IndexError):
+        return 0.0
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            children = [int(child) for child in f.read().split()]
+    except (OSError, ValueError):
+        children = []
+    return ticks / os.sysconf('SC_CLK_TCK') + sum(read_cpu_seconds(child) for child in children)
+
+
+def sample_usage(pid: int, result: ExecutionResult):
+    # Both read 0 once the process is gone, so a late sample never lowers a result
+    result.cpu_seconds = max(result.cpu_seconds, read_cpu_seconds(pid) - result.cpu_baseline_seconds)
+    result.peak_rss_bytes = max(result.peak_rss_bytes, read_peak_rss(pid))
+
+
+async def watch_usage(process: asyncio.subprocess.Process, result: ExecutionResult,
+                      interval: float = RSS_SAMPLE_INTERVAL_SECONDS):
+    """
+    Sample the CPU time and peak RSS of this one process until it exits. Nothing reaped
+    elsewhere is counted, unlike RUSAGE_CHILDREN; what M2 uses between the last sample
+    and its exit, at most one interval's worth, is missed.
+    """
+    while process.returncode is None:
+        sample_usage(process.pid, result)
+        await asyncio.sleep(interval)
+
+
+class OutputStream:
+    """
+    Incremental view of one M2 run: iterate `chunks()` to receive stdout as it arrives,
+    then read `result` for the exit status, stderr and resource usage. The pipe is only
+    read as fast as the consumer iterates, so a slow client throttles M2 instead of
+    filling memory.
+    """
+
+    def __init__(self, process: asyncio.subprocess.Process, code: str,
+                 timeout: float = WALL_TIMEOUT_SECONDS, spawn_seconds: float = 0.0):
+        self.process = process
+        self.code = code
+        self.timeout = timeout
+        self.result = ExecutionResult(returncode=None, stdout="", stderr="", spawn_seconds=spawn_seconds)
+
+    async def chunks(self):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + self.timeout
+        result = self.result
+        # A warm interpreter has already spent CPU loading; only what it uses from here on is this run's
+        result.cpu_baseline_seconds = read_cpu_seconds(self.process.pid)
+        cgroup_baseline = sandbox_cpu_seconds(self.process)
+        feeder = asyncio.create_task(feed_stdin(self.process, (self.code + "\nexit\n").encode('utf-8')))
+        stderr = asyncio.create_task(read_stream(self.process.stderr))
+        sampler = asyncio.create_task(watch_usage(self.process, result))
+        try:
+            while chunk := await asyncio.wait_for(self.process.stdout.read(READ_CHUNK_SIZE),
+                                                  deadline - loop.time()):
+                if result.first_byte_seconds is None:
+                    result.first_byte_seconds = loop.time() - start
+                result.output_bytes += len(chunk)
+                yield chunk
+            sample_usage(self.process.pid, result)
+            await asyncio.wait_for(self.process.wait(), max(0, deadline - loop.time()))
+            result.stderr = (await stderr).decode('utf-8', errors='replace')
+        except asyncio.TimeoutError:
+            result.timed_out = True
+            sample_usage(self.process.pid, result)
+            kill_process_group(self.process)
+            await self.process.wait()
+        finally:
+            # Also reached when the consumer stops early or is cancelled, so those runs are measured too
+            sample_usage(self.process.pid, result)
+            result.wall_seconds = loop.time() - start
+            kill_process_group(self.process)
+            feeder.cancel()
+            stderr.cancel()
+            sampler.cancel()
+
+        result.returncode = self.process.returncode
+        usage = await release_sandbox(self.process)
+        if usage:
+            # Exact per-job numbers; the /proc samples miss the last interval and processes that left the tree
+            cpu_seconds, peak, result.oom_killed = usage
+            result.cpu_seconds = max(result.cpu_seconds, cpu_seconds - cgroup_baseline)
+            result.peak_rss_bytes = max(result.peak_rss_bytes, peak)
+
+
+async def run_in_process(process: asyncio.subprocess.Process, code: str,
+                         timeout: float = WALL_TIMEOUT_SECONDS, spawn_seconds: float = 0.0,
+                         capture=None) -> ExecutionResult:
+    """
+    Feed code to an already started M2 and collect its output without blocking the event loop.
+    On timeout or cancellation the whole process group is killed.
+
+    With a `capture` (an `output_store.SpooledOutput`) stdout is written to it instead of
+    being kept in memory, and `result.stdout` is only the head of it.
+    """
+    output = OutputStream(process, code, timeout, spawn_seconds)
+    if capture is None:
+        async with aclosing(output.chunks()) as chunks:
+            stdout = [chunk async for chunk in chunks]
+        output.result.stdout = b''.join(stdout).decode('utf-8', errors='replace')
+        return output.result
+
+    try:
+        async with aclosing(output.chunks()) as chunks:
+            async for chunk in chunks:
+                capture.write(chunk)
+        capture.close()
+    except BaseException:
+        capture.discard()
+        raise
+    output.result.stdout = capture.head()
+    output.result.output_handle = capture.handle
+    output.result.output_truncated = capture.truncated
+    return output.result
+
+
+async def run_m2(code: str, cwd: str, timeout: float = WALL_TIMEOUT_SECONDS, command: list[str] = M2_COMMAND,
+                 cpu_limit_seconds: int = CPU_LIMIT_SECONDS, capture=None) -> ExecutionResult:
+    """Start a fresh `M2 --stop` in cwd and run code through it"""
+    start = time.monotonic()
+    process = await spawn_m2(cwd, command, cpu_limit_seconds=cpu_limit_seconds)
+    try:
+        return await run_in_process(process, code, timeout, spawn_seconds=time.monotonic() - start,
+                                    capture=capture)
+    finally:
+        await release_sandbox(process)
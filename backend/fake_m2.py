@@ -0,0 +1,36 @@
+import os
+import stat
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+FAKE_M2_SCRIPT = """#!/bin/sh
+if [ "$1" = "--version" ]; then
+    echo "1.0-fake"
+    exit 0
+fi
+cat > /dev/null
+sleep "${FAKE_M2_DELAY:-0.5}"
+echo "i1 : 2+2"
+echo
+echo "o1 = 4"
+echo
+echo "i2 : exit"
+"""
+
+
+@contextmanager
+def fake_m2_on_path(script: str = FAKE_M2_SCRIPT, **env):
+    """Put a stand-in `M2` executable first on PATH for benchmarks without Macaulay2 installed"""
+    saved = dict(os.environ)
+    with tempfile.TemporaryDirectory() as bin_dir:
+        m2 = Path(bin_dir) / "M2"
+        m2.write_text(script)
+        m2.chmod(m2.stat().st_mode | stat.S_IEXEC)
+        os.environ["PATH"] = bin_dir + os.pathsep + os.environ["PATH"]
+        os.environ.update({key: str(value) for key, value in env.items()})
+        try:
+            yield m2
+        finally:
+            os.environ.clear()
+            os.environ.update(saved)
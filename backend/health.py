@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import time
+
+from executor import probe_m2_version, run_m2
+from workspaces import acquire_workspace, release_workspace
+
+logger = logging.getLogger(__name__)
+
+PROBE_CODE = "2+2"
+PROBE_TIMEOUT_SECONDS = 10
+
+
+class HealthProber:
+    """
+    Refreshes M2 availability, version and the latency of a tiny computation on a schedule,
+    so health endpoints answer from memory instead of spawning M2 per request.
+    """
+
+    def __init__(self, interval: float, max_age: float, on_version=None):
+        self.interval = interval
+        self.max_age = max_age
+        self.on_version = on_version
+        self.m2_version: str | None = None
+        self.probe_ok = False
+        self.probe_latency_seconds: float | None = None
+        self.error: str | None = None
+        self.checked_at: float | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        await self.probe()
+        self._task = asyncio.create_task(self._probe_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def probe(self):
+        self.m2_version = await probe_m2_version()
+        if self.on_version:
+            self.on_version(self.m2_version)
+        self.probe_ok, self.probe_latency_seconds, self.error = False, None, None
+        if self.m2_version is None:
+            self.error = "M2 --version failed"
+        else:
+            start = time.monotonic()
+            try:
+                workdir = acquire_workspace()
+                try:
+                    result = await run_m2(PROBE_CODE, cwd=workdir, timeout=PROBE_TIMEOUT_SECONDS)
+                finally:
+                    release_workspace(workdir)
+                self.probe_latency_seconds = time.monotonic() - start
+                self.probe_ok = result.returncode == 0 and "= 4" in result.stdout
+                if not self.probe_ok:
+                    self.error = "Timeout" if result.timed_out else f"Probe exited with code {result.returncode}"
+            except Exception as e:
+                self.error = str(e)
+        self.checked_at = time.time()
+        if not self.probe_ok:
+            logger.warning(f"M2 health probe failed: {self.error}")
+
+    def is_fresh(self) -> bool:
+        return self.checked_at is not None and time.time() - self.checked_at < self.max_age
+
+    def snapshot(self) -> dict:
+        return {
+            "macaulay2_available": self.m2_version is not None,
+            "macaulay2_version": self.m2_version,
+            "probe_ok": self.probe_ok,
+            "probe_latency_seconds": self.probe_latency_seconds,
+            "probe_error": self.error,
+            "checked_at": self.checked_at,
+        }
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.probe()
@@ -0,0 +1,280 @@
+import asyncio
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# A job whose runner died mid-run is retried, but not forever
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    client TEXT NOT NULL,
+    code TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    error TEXT,
+    result BLOB,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+"""
+
+JOB_FIELDS = "id, client, tier, status, attempts, error, created_at, started_at, finished_at"
+
+
+class JobStore:
+    """
+    Jobs in a SQLite table (WAL mode), shared by every worker process and surviving
+    restarts. Status moves queued -> running -> done | failed | cancelled. Results
+    are stored zlib-compressed and deleted `result_ttl_seconds` after the job ends.
+    """
+
+    def __init__(self, db_file: str, result_ttl_seconds: float):
+        self.db_file = db_file
+        self.result_ttl_seconds = result_ttl_seconds
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+
+    def load(self):
+        with self._lock:
+            self._connect().executescript(SCHEMA)
+
+    def submit(self, code: str, client: str, tier: str) -> str:
+        job_id = secrets.token_urlsafe(16)
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO jobs (id, client, code, tier, status, created_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, client, code, tier, time.time()),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        with self._transaction() as db:
+            row = db.execute(f"SELECT {JOB_FIELDS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = dict(zip(JOB_FIELDS.split(", "), row))
+            job["position"] = None
+            if job["status"] == "queued":
+                job["position"] = db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at < ?", (job["created_at"],)
+                ).fetchone()[0]
+        return job
+
+    def result(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._connect().execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def queued_for(self, client: str) -> int:
+        with self._lock:
+            return self._connect().execute(
+                "SELECT COUNT(*) FROM jobs WHERE client = ? AND status IN ('queued', 'running')", (client,)
+            ).fetchone()[0]
+
+    def cancel(self, job_id: str) -> str | None:
+        """Cancel a queued job at once; a running one is flagged and stopped by its runner"""
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if row[0] == "queued":
+                db.execute(
+                    "UPDATE jobs SET status = 'cancelled', finished_at = ?, expires_at = ? WHERE id = ?",
+                    (now, now + self.result_ttl_seconds, job_id),
+                )
+                return "cancelled"
+            if row[0] == "running":
+                db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            return row[0]
+
+    def claim(self, worker: str, stale_before: float) -> tuple[str, str, str, str] | None:
+        """Take the oldest queued job, first putting back jobs whose runner stopped sending heartbeats"""
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND heartbeat_at < ?",
+                (stale_before,),
+            )
+            db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ?, expires_at = ? "
+                "WHERE status = 'queued' AND cancel_requested = 1",
+                (now, now + self.result_ttl_seconds),
+            )
+            db.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Runner stopped repeatedly while running this job', "
+                "finished_at = ?, expires_at = ? WHERE status = 'queued' AND attempts >= ?",
+                (now, now + self.result_ttl_seconds, MAX_ATTEMPTS),
+            )
+            row = db.execute(
+                "SELECT id, code, tier, client FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                "started_at = ?, heartbeat_at = ? WHERE id = ?",
+                (worker, now, now, row[0]),
+            )
+        return row
+
+    def heartbeat(self, job_id: str, worker: str) -> bool:
+        """Mark the job alive; True when it has been asked to stop"""
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND worker = ?", (time.time(), job_id, worker))
+            row = db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def finish(self, job_id: str, worker: str, status: str, result: dict | None = None, error: str | None = None):
+        now = time.time()
+        blob = zlib.compress(json.dumps(result).encode('utf-8')) if result is not None else None
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, expires_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (status, blob, error, now, now + self.result_ttl_seconds, job_id, worker),
+            )
+
+    def requeue(self, job_id: str, worker: str):
+        """Hand a job back on shutdown; the interrupted attempt does not count"""
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, attempts = attempts - 1 "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (job_id, worker),
+            )
+
+    def expire(self) -> int:
+        with self._transaction() as db:
+            return db.execute("DELETE FROM jobs WHERE expires_at < ?", (time.time(),)).rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            # Autocommit mode; writes open their own BEGIN IMMEDIATE transaction
+            db = sqlite3.connect(self.db_file, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._db = db
+        return self._db
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+
+class JobRunner:
+    """
+    Pulls jobs from the store and runs up to `concurrency` of them in this process.
+    `execute(code, tier, client)` does the actual run and returns the JSON-ready result.
+    Every runner heartbeats its jobs, so one that dies mid-run has its jobs picked
+    up again by any other process once they go stale.
+    """
+
+    def __init__(self, store: JobStore, execute, concurrency: int, poll_interval: float,
+                 heartbeat_interval: float):
+        self.store = store
+        self.execute = execute
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_id = f"{os.getpid()}-{secrets.token_hex(4)}"
+        self._tasks: list[asyncio.Task] = []
+        self._running: set[str] = set()
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._work_loop()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._expire_loop()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for job_id in list(self._running):
+            await asyncio.to_thread(self.store.requeue, job_id, self.worker_id)
+
+    async def _work_loop(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(
+                    self.store.claim, self.worker_id, time.time() - 6 * self.heartbeat_interval)
+            except Exception as e:
+                logger.error(f"Failed to claim a job: {e}")
+                job = None
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                await self._run(*job)
+            except Exception as e:
+                # Once its heartbeat is stale the job is claimed again, here or by another process
+                logger.error(f"Lost track of job {job[0]}, it will be retried: {e}")
+                self._running.discard(job[0])
+
+    async def _run(self, job_id: str, code: str, tier: str, client: str):
+        self._running.add(job_id)
+        # On cancellation (shutdown) the job stays in _running, so stop() puts it back in the queue
+        await self._supervise(job_id, code, tier, client)
+        self._running.discard(job_id)
+
+    async def _supervise(self, job_id: str, code: str, tier: str, client: str):
+        run = asyncio.create_task(self.execute(code, tier, client))
+        try:
+            while not (await asyncio.wait({run}, timeout=self.heartbeat_interval))[0]:
+                if await asyncio.to_thread(self.store.heartbeat, job_id, self.worker_id):
+                    run.cancel()
+                    await asyncio.gather(run, return_exceptions=True)
+                    await asyncio.to_thread(self.store.finish, job_id, self.worker_id, "cancelled")
+                    return
+        except BaseException:
+            # Shutdown, or the store failing on a heartbeat: the run must not go on without an owner
+            run.cancel()
+            raise
+        try:
+            result = run.result()
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            await asyncio.to_thread(self.store.finish, job_id, self.worker_id, "failed", error=str(e))
+            return
+        await asyncio.to_thread(self.store.finish, job_id, self.worker_id, "done", result)
+
+    async def _expire_loop(self):
+        while True:
+            try:
+                expired = await asyncio.to_thread(self.store.expire)
+                if expired:
+                    logger.info(f"Deleted {expired} expired jobs")
+            except Exception as e:
+                logger.error(f"Failed to expire jobs: {e}")
+            await asyncio.sleep(60)
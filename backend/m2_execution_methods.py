@@ -1,111 +1,128 @@
-
-import subprocess
-import tempfile
-import os
+import asyncio
+import time
 from pathlib import Path
 
+from executor import WALL_TIMEOUT_SECONDS, ExecutionResult, release_sandbox, run_in_process, spawn_m2
+from packages import PreambleStripper
+from profiling import significant, split_statements
+from workspaces import acquire_workspace, release_workspace
 
-def execute_m2_stdin(code: str, timeout: int = 35, set_resource_limits=None):
-    """
-    Execute M2 code using stdin (pipe method)
-    This method sends code directly to M2's standard input
-    """
-    result = subprocess.run(
-        ['M2', '-q', '--stop'],  # -q: quiet, --stop: non-interactive
-        input=code + "\nexit\n",  # Add exit to ensure M2 terminates
-        capture_output=True,
-        text=True,
-        timeout=timeout,
-        preexec_fn=set_resource_limits if os.name != 'nt' else None,
-    )
-    return result
-
-
-def execute_m2_script(code: str, timeout: int = 35, set_resource_limits=None):
+
+def print_last_expression(code: str) -> str:
     """
-    Execute M2 code using --script flag with file
-    This is the current default method
+    Wrap the last statement in `print` unless it ends with `;`, so `--script` runs show
+    the final value the way the interactive transcript would. Only a statement that is
+    all on one line is wrapped; one spread over several lines is left as it is.
     """
-    with tempfile.TemporaryDirectory() as temp_dir:
-        code_file = Path(temp_dir) / "input.m2"
-        code_file.write_text(code, encoding='utf-8')
-        
-        result = subprocess.run(
-            ['M2', '--script', str(code_file)],
-            cwd=temp_dir,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            preexec_fn=set_resource_limits if os.name != 'nt' else None,
-        )
-        return result
+    statements = split_statements(code)
+    if not statements:
+        return code
+    expression = significant(statements[-1]).strip()
+    lines = code.split('\n')
+    last = max(i for i, line in enumerate(lines) if significant(line).strip())
+    if expression.endswith(';') or significant(lines[last]).strip() != expression:
+        return code
+    lines[last] = f"print({expression})"
+    return '\n'.join(lines)
 
 
-def execute_m2_quiet_script(code: str, timeout: int = 35, set_resource_limits=None):
+class PoolStrategy:
     """
-    Execute M2 code using -q --script flags
-    Suppresses banner and runs script
+    Production path: a pre-started `M2 --stop` from the warm pool, code on stdin.
+    When the pool runs lean (`packages.ready`), the packages the code uses are loaded first.
     """
-    with tempfile.TemporaryDirectory() as temp_dir:
-        code_file = Path(temp_dir) / "input.m2"
-        code_file.write_text(code, encoding='utf-8')
-        
-        result = subprocess.run(
-            ['M2', '-q', '--script', str(code_file)],
-            cwd=temp_dir,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            preexec_fn=set_resource_limits if os.name != 'nt' else None,
-        )
+
+    def __init__(self, pool, packages=None):
+        self.pool = pool
+        self.packages = packages
+
+    async def execute(self, code: str, timeout: float = WALL_TIMEOUT_SECONDS, capture=None) -> ExecutionResult:
+        preamble = self.packages.preamble(code) if self.packages and self.packages.ready else ""
+        if not preamble:
+            return await self.pool.execute(code, timeout, capture=capture)
+        if capture is None:
+            result = await self.pool.execute(f"{preamble}\n{code}", timeout)
+            stdout = self.packages.strip_preamble(result.stdout, preamble)
+            result.output_bytes -= len(result.stdout.encode('utf-8')) - len(stdout.encode('utf-8'))
+            result.stdout = stdout
+            return result
+        # Stripped from the stream, so the spilled file and the head agree
+        stripper = PreambleStripper(capture, preamble)
+        result = await self.pool.execute(f"{preamble}\n{code}", timeout, capture=stripper)
+        result.output_bytes -= stripper.stripped
         return result
 
 
-def execute_m2_with_print(code: str, timeout: int = 35, set_resource_limits=None):
+class FreshProcessStrategy:
     """
-    Execute M2 code wrapped with explicit print
-    Forces output even if last expression doesn't auto-print
+    One new M2 per run in its own workspace. With `script` the code is
+    written to input.m2 and passed as the last argument instead of going to stdin.
     """
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # Wrap each line that looks like an expression with print
-        wrapped_code = code
-        
-        code_file = Path(temp_dir) / "input.m2"
-        code_file.write_text(wrapped_code, encoding='utf-8')
-        
-        result = subprocess.run(
-            ['M2', '-q', '--script', str(code_file)],
-            cwd=temp_dir,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            preexec_fn=set_resource_limits if os.name != 'nt' else None,
-        )
-        return result
+
+    def __init__(self, command: list[str], script: bool = False, transform=None):
+        self.command = command
+        self.script = script
+        self.transform = transform
+
+    async def execute(self, code: str, timeout: float = WALL_TIMEOUT_SECONDS, capture=None) -> ExecutionResult:
+        if self.transform:
+            code = self.transform(code)
+        workdir = acquire_workspace()
+        try:
+            command = self.command
+            if self.script:
+                code_file = Path(workdir) / "input.m2"
+                await asyncio.to_thread(code_file.write_text, code, 'utf-8')
+                command, code = [*command, str(code_file)], ""
+            start = time.monotonic()
+            process = await spawn_m2(workdir, command)
+            try:
+                return await run_in_process(process, code, timeout, spawn_seconds=time.monotonic() - start,
+                                            capture=capture)
+            finally:
+                await release_sandbox(process)
+        finally:
+            release_workspace(workdir)
+
+
+def build_strategies(pool, packages=None) -> dict:
+    """Every way of running M2 this backend knows, by the name used in M2_EXECUTION_STRATEGY"""
+    return {
+        "pool": PoolStrategy(pool, packages),
+        "stdin": FreshProcessStrategy(['M2', '-q', '--stop']),
+        "script": FreshProcessStrategy(['M2', '--script'], script=True),
+        "quiet_script": FreshProcessStrategy(['M2', '-q', '--script'], script=True),
+        "print": FreshProcessStrategy(['M2', '-q', '--script'], script=True, transform=print_last_expression),
+    }
+
+
+def select_strategy(strategies: dict, name: str):
+    if name not in strategies:
+        raise ValueError(f"Unknown M2 execution strategy {name!r}, expected one of {', '.join(strategies)}")
+    return strategies[name]
 
 
 # Test function
 if __name__ == "__main__":
+    from pool import M2Pool
+
     test_code = """R = QQ[x,y,z]
 I = ideal(x^2 + y^2, z^2)
 I"""
 
+    async def compare():
+        pool = M2Pool(min_size=0, max_size=1, refill_per_second=1, max_idle_seconds=60, health_check_interval=5)
+        for name, strategy in build_strategies(pool).items():
+            print(f"\n{name.upper()}:")
+            print("-" * 60)
+            try:
+                result = await strategy.execute(test_code, timeout=10)
+                print(f"Return code: {result.returncode}  wall: {result.wall_seconds:.2f}s")
+                print(f"STDOUT ({len(result.stdout)} chars): {result.stdout[:200]}")
+                print(f"STDERR ({len(result.stderr)} chars): {result.stderr[:200]}")
+            except Exception as e:
+                print(f"Error: {e}")
+
     print("Testing different M2 execution methods...")
     print("=" * 60)
-    
-    methods = [
-        ("stdin", execute_m2_stdin),
-        ("script", execute_m2_script),
-        ("quiet_script", execute_m2_quiet_script),
-    ]
-    
-    for name, func in methods:
-        print(f"\n{name.upper()}:")
-        print("-" * 60)
-        try:
-            result = func(test_code, timeout=10)
-            print(f"Return code: {result.returncode}")
-            print(f"STDOUT ({len(result.stdout)} chars): {result.stdout[:200]}")
-            print(f"STDERR ({len(result.stderr)} chars): {result.stderr[:200]}")
-        except Exception as e:
-            print(f"Error: {e}")
+    asyncio.run(compare())
@@ -1,14 +1,38 @@
-import resource
-import subprocess
-import tempfile
 import os
-from pathlib import Path
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 
-import threading
+import config
+from budgets import CpuBudgets
+from cgroups import CgroupSandbox
+from executor import (CPU_LIMIT_SECONDS, MEMORY_LIMIT_BYTES, WALL_TIMEOUT_SECONDS, ExecutionResult, OutputStream, read_rss,
+                      run_m2, sandbox_mode, use_sandbox)
+from health import HealthProber
+from jobs import JobRunner, JobStore
+from m2_execution_methods import build_strategies, select_strategy
+import metrics
+from output_store import OutputNotFound, OutputStore, SpooledOutput
+from packages import LEAN_COMMAND, PackageIndex
+from pool import M2Pool
+from predictor import RuntimePredictor
+from preflight import check_syntax
+from profiling import ProbeReader, instrument, split_statements, strip_probes
+from result_cache import ResultCache
+from scheduler import AdmissionRejected, FairScheduler, default_max_concurrency
+from sessions import SessionEnded, SessionLimitReached, SessionManager, SessionNotFound, error_lines
+from stats_store import StatsStore
+from traces import TraceRecorder
+from transcript import PromptSplitter, TranscriptParser, parse_transcript, stderr_error_lines
+from workspaces import WorkspaceManager, acquire_workspace, release_workspace, use_workspaces
+from wire import MSGPACK_MEDIA_TYPES, CompressionMiddleware, pack_msgpack, wants_msgpack
+
+import asyncio
+import codecs
+import time
+from typing import Literal
+from contextlib import aclosing
 from datetime import datetime
 import logging
 import json
@@ -19,53 +43,15 @@ logger = logging.getLogger(__name__)
 
 # Use absolute path for stats file to avoid CWD issues
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-STATS_FILE = os.path.join(BASE_DIR, "stats.json")
-
-# In-memory statistics (thread-safe)
-stats_lock = threading.Lock()
-stats = {
-    'requests_per_day': {},  # {date_str: int}
-    'unique_users_per_day': {},  # {date_str: set(ip)}
-}
+STATS_DB_FILE = config.STATS_DB_FILE or os.path.join(BASE_DIR, "stats.db")
+# Written by earlier versions, imported into the database once
+LEGACY_STATS_FILES = (os.path.join(BASE_DIR, "stats.json"), os.path.join(BASE_DIR, "stats_history.jsonl"))
 
-def load_stats():
-    global stats
-    if os.path.exists(STATS_FILE):
-        try:
-            with open(STATS_FILE, 'r') as f:
-                data = json.load(f)
-                # Convert lists back to sets for unique_users_per_day
-                if 'unique_users_per_day' in data:
-                    for date_str, users in data['unique_users_per_day'].items():
-                        data['unique_users_per_day'][date_str] = set(users)
-                # Merge loaded stats with default structure to ensure all keys exist
-                if 'requests_per_day' not in data:
-                    data['requests_per_day'] = {}
-                if 'unique_users_per_day' not in data:
-                    data['unique_users_per_day'] = {}
-                
-                with stats_lock:
-                    stats = data
-            logger.info(f"Stats loaded successfully from {STATS_FILE}")
-        except Exception as e:
-            logger.error(f"Failed to load stats from {STATS_FILE}: {e}")
-
-def save_stats():
-    try:
-        with stats_lock:
-            # Convert sets to list for JSON serialization
-            stats_copy = {
-                'requests_per_day': stats['requests_per_day'],
-                'unique_users_per_day': {k: list(v) for k, v in stats['unique_users_per_day'].items()}
-            }
-        
-        with open(STATS_FILE, 'w') as f:
-            json.dump(stats_copy, f)
-    except Exception as e:
-        logger.error(f"Failed to save stats to {STATS_FILE}: {e}")
+stats_store = StatsStore(STATS_DB_FILE, flush_interval=config.STATS_FLUSH_INTERVAL_SECONDS,
+                         legacy_files=LEGACY_STATS_FILES)
 
-# Load stats on startup
-load_stats()
+trace_recorder = TraceRecorder(config.TRACE_FILE, flush_interval=config.TRACE_FLUSH_INTERVAL_SECONDS,
+                               hash_key=config.TRACE_HASH_KEY)
 
 app = FastAPI(
     title="Macaulay2 Web Interface API",
@@ -73,16 +59,188 @@ app = FastAPI(
     version="1.0.0"
 )
 
+m2_pool = M2Pool(
+    min_size=config.POOL_MIN_SIZE,
+    max_size=config.POOL_MAX_SIZE,
+    refill_per_second=config.POOL_REFILL_PER_SECOND,
+    max_idle_seconds=config.POOL_MAX_IDLE_SECONDS,
+    health_check_interval=config.POOL_HEALTH_CHECK_INTERVAL,
+)
+
+package_index = PackageIndex()
+strategies = build_strategies(m2_pool, package_index)
+execution_strategy = select_strategy(strategies, config.EXECUTION_STRATEGY)
+
+scheduler = FairScheduler(
+    max_concurrency=config.MAX_CONCURRENT_EXECUTIONS or default_max_concurrency(MEMORY_LIMIT_BYTES),
+    max_queue=config.MAX_QUEUED_EXECUTIONS,
+    max_queue_per_client=config.MAX_QUEUED_PER_CLIENT,
+    max_wait_seconds=config.MAX_QUEUE_WAIT_SECONDS,
+    predictor=RuntimePredictor(config.PREDICTOR_HISTORY_SIZE),
+    fast_lane_slots=config.FAST_LANE_SLOTS,
+    fast_lane_seconds=config.FAST_LANE_SECONDS,
+)
+
+cpu_budgets = CpuBudgets(
+    capacity=config.CPU_BUDGET_SECONDS,
+    refill_per_second=config.CPU_BUDGET_REFILL_PER_SECOND,
+    max_clients=config.CPU_BUDGET_MAX_CLIENTS,
+)
+
+result_cache = ResultCache(
+    max_entries=config.RESULT_CACHE_MAX_ENTRIES,
+    max_bytes=config.RESULT_CACHE_MAX_BYTES,
+    directory=config.RESULT_CACHE_DIR,
+    disk_max_entries=config.RESULT_CACHE_DISK_MAX_ENTRIES,
+)
+
+output_store = OutputStore(
+    directory=config.OUTPUT_SPILL_DIR,
+    threshold=config.OUTPUT_SPILL_THRESHOLD_BYTES,
+    head_bytes=config.OUTPUT_HEAD_BYTES,
+    max_bytes=config.OUTPUT_MAX_BYTES,
+    ttl_seconds=config.OUTPUT_TTL_SECONDS,
+    sweep_interval=config.OUTPUT_SWEEP_INTERVAL_SECONDS,
+)
+
+workspaces = WorkspaceManager(
+    root=config.WORKSPACE_ROOT,
+    slots=config.WORKSPACE_SLOTS,
+    quota_bytes=config.WORKSPACE_QUOTA_BYTES,
+    reap_interval=config.WORKSPACE_REAP_INTERVAL_SECONDS,
+)
+
+preview_log_sampler = metrics.LogSampler(config.PREVIEW_LOG_SAMPLE_RATE, config.PREVIEW_LOG_MAX_PER_MINUTE)
+
+session_manager = SessionManager(
+    max_sessions=config.MAX_SESSIONS,
+    idle_ttl_seconds=config.SESSION_IDLE_TTL_SECONDS,
+    sweep_interval=config.SESSION_SWEEP_INTERVAL_SECONDS,
+)
+
+
+def use_m2_version(version: str | None):
+    result_cache.m2_version = version
+
+
+health_prober = HealthProber(
+    interval=config.HEALTH_PROBE_INTERVAL_SECONDS,
+    max_age=config.HEALTH_PROBE_MAX_AGE_SECONDS,
+    on_version=use_m2_version,
+)
+
+
+# Wall-clock limit per job tier; the CPU limit is raised to match for the longer tiers
+JOB_TIERS = {
+    "standard": WALL_TIMEOUT_SECONDS,
+    "long": config.JOB_LONG_TIMEOUT_SECONDS,
+    "extended": config.JOB_EXTENDED_TIMEOUT_SECONDS,
+}
+
+
+async def run_job(code: str, tier: str, client: str) -> dict:
+    timeout = JOB_TIERS[tier]
+    # Jobs count against the same cap as /execute, so they cannot add M2s beyond what RAM fits
+    async with scheduler.slot(client, throttled=cpu_budgets.over_budget(client), background=True):
+        workdir = acquire_workspace()
+        try:
+            # Output is kept whole up to the cap, there is no spill file to page through later
+            capture = SpooledOutput(workdir, config.JOB_MAX_OUTPUT_BYTES, 0, config.JOB_MAX_OUTPUT_BYTES)
+            result = await run_m2(code, workdir, timeout, cpu_limit_seconds=max(CPU_LIMIT_SECONDS, timeout),
+                                  capture=capture)
+        finally:
+            release_workspace(workdir)
+    cpu_budgets.charge(client, result.cpu_seconds)
+    return build_code_response(result, timeout).model_dump(exclude={'cached', 'cells', 'output_handle'})
+
+
+job_store = JobStore(config.JOBS_DB_FILE or os.path.join(BASE_DIR, "jobs.db"),
+                     result_ttl_seconds=config.JOB_RESULT_TTL_SECONDS)
+
+job_runner = JobRunner(
+    job_store,
+    run_job,
+    concurrency=config.JOB_CONCURRENCY,
+    poll_interval=config.JOB_POLL_INTERVAL_SECONDS,
+    heartbeat_interval=config.JOB_HEARTBEAT_INTERVAL_SECONDS,
+)
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else 'unknown'
+
+
+def configure_sandbox():
+    if config.SANDBOX != "cgroup":
+        return
+    sandbox = CgroupSandbox(
+        root=config.CGROUP_ROOT,
+        memory_max_bytes=config.CGROUP_MEMORY_MAX_BYTES,
+        cpu_max_cores=config.CGROUP_CPU_MAX_CORES,
+        pids_max=config.CGROUP_PIDS_MAX,
+    )
+    if sandbox.available():
+        use_sandbox(sandbox)
+        logger.info(f"Running M2 in per-job cgroups under {config.CGROUP_ROOT}")
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    # Opened here rather than at import, so importing main (as the bench scripts do) touches no database
+    await asyncio.to_thread(stats_store.load)
+    await asyncio.to_thread(job_store.load)
+    configure_sandbox()
+    await workspaces.start()
+    use_workspaces(workspaces)
+    # The pool only starts lean once the index can tell which packages each snippet needs
+    if config.LEAN_STARTUP and await package_index.build():
+        m2_pool.command = LEAN_COMMAND
+    await health_prober.start()
+    await m2_pool.start()
+    await session_manager.start()
+    await output_store.start()
+    await job_runner.start()
+    await stats_store.start()
+    await trace_recorder.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await health_prober.stop()
+    await m2_pool.stop()
+    await session_manager.stop()
+    await output_store.stop()
+    await job_runner.stop()
+    await stats_store.stop()
+    await trace_recorder.stop()
+    await workspaces.stop()
+
 # Statistics endpoint
 @app.get("/admin/stats")
-async def get_stats():
-    with stats_lock:
-        # Convert sets to list for JSON serialization
-        stats_copy = {
-            'requests_per_day': dict(stats['requests_per_day']),
-            'unique_users_per_day': {k: list(v) for k, v in stats['unique_users_per_day'].items()}
-        }
-    return JSONResponse(content=stats_copy)
+async def get_stats(start: str | None = None, end: str | None = None,
+                    rollup: Literal['day', 'week', 'month'] = 'day'):
+    """Request counts and estimated unique visitors, optionally for a YYYY-MM-DD range"""
+    return JSONResponse(content=await asyncio.to_thread(stats_store.snapshot, start, end, rollup))
+
+@app.get("/admin/slow-constructs")
+async def get_slow_constructs(limit: int = Query(20, ge=1, le=1000)):
+    """Top-level constructs from profiled runs, by total wall time"""
+    return JSONResponse(content=await asyncio.to_thread(stats_store.slowest_constructs, limit))
+
+@app.get("/admin/top-consumers")
+async def get_top_consumers(limit: int = Query(20, ge=1, le=1000)):
+    """
+    Clients by CPU seconds used in this worker, with their remaining CPU budget. Clients
+    are shown as the same keyed hash the traces use, never as IP addresses.
+    """
+    clients = cpu_budgets.top(limit)
+    for client in clients:
+        client["client"] = trace_recorder.anonymize(client["client"], 8)
+    return {
+        "capacity_seconds": cpu_budgets.capacity,
+        "refill_per_second": cpu_budgets.refill_per_second,
+        "clients": clients,
+    }
 
 # Middleware to track statistics
 @app.middleware("http")
@@ -92,18 +250,8 @@ async def stats_middleware(request: Request, call_next):
         return await call_next(request)
 
     date_str = datetime.utcnow().strftime('%Y-%m-%d')
-    ip = request.client.host if request.client else 'unknown'
-    with stats_lock:
-        # Increment requests per day
-        stats['requests_per_day'].setdefault(date_str, 0)
-        stats['requests_per_day'][date_str] += 1
-        # Track unique users per day
-        stats['unique_users_per_day'].setdefault(date_str, set())
-        stats['unique_users_per_day'][date_str].add(ip)
-    
-    # Save stats
-    save_stats()
-    
+    stats_store.record(date_str, client_ip(request))
+
     response = await call_next(request)
     return response
 
@@ -122,10 +270,43 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=config.COMPRESSION_MIN_BYTES)
 
 
 class CodeRequest(BaseModel):
     code: str
+    # "cells" returns the transcript already split into cells instead of raw stdout
+    format: Literal['text', 'cells'] = 'text'
+    # Time each top-level statement; profiled runs bypass the result cache
+    profile: bool = False
+
+
+class TranscriptCell(BaseModel):
+    n: int
+    input: str
+    value: str | None = None
+    type: str | None = None
+    output: str = ""
+    errors: list[str] = []
+
+
+class CellProfile(BaseModel):
+    n: int
+    input: str
+    # The construct the cell mostly is, see profiling.construct_of
+    kind: str
+    wall_seconds: float
+    # None for the cell M2 was still in when it stopped
+    cpu_seconds: float | None = None
+    memory_growth_bytes: int | None = None
+    complete: bool = True
+
+
+class ProfileReport(BaseModel):
+    cells: list[CellProfile]
+    wall_seconds: float
+    cpu_seconds: float
+    peak_rss_bytes: int
 
 
 class CodeResponse(BaseModel):
@@ -133,246 +314,651 @@ class CodeResponse(BaseModel):
     stderr: str
     success: bool
     error_message: str | None = None
+    cached: bool = False
+    cells: list[TranscriptCell] | None = None
+    # Set when stdout was too large to inline: `stdout` is its head, the rest is at /outputs/{output_handle}
+    output_handle: str | None = None
+    output_bytes: int | None = None
+    output_truncated: bool = False
+    # What the pre-flight check found wrong with the code, M2-style
+    syntax_error: str | None = None
+    profile: ProfileReport | None = None
+    # The client was over its CPU budget: it queued behind everyone else and had a shorter timeout
+    throttled: bool = False
 
 
-def set_resource_limits():
-    """Set resource limits for child process (Linux/Unix only)"""
-    try:
-        # 2GB memory limit (soft and hard)
-        resource.setrlimit(resource.RLIMIT_AS, (2_000_000_000, 2_000_000_000))
-        # 120 second CPU time limit
-        resource.setrlimit(resource.RLIMIT_CPU, (120, 120))
-        # Limit number of processes
-        resource.setrlimit(resource.RLIMIT_NPROC, (50, 50))
-        # Limit file size to 100MB
-        resource.setrlimit(resource.RLIMIT_FSIZE, (100_000_000, 100_000_000))
-    except (ValueError, OSError, AttributeError) as e:
-        # On Windows or if limits can't be set, just log warning
-        logger.warning(f"Could not set resource limits (this is normal on Windows): {e}")
+class BatchRequest(BaseModel):
+    items: list[CodeRequest]
+    timeout_seconds: float = Field(WALL_TIMEOUT_SECONDS, gt=0, le=WALL_TIMEOUT_SECONDS)
+    stream: bool = False
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: Literal['ok', 'invalid', 'rejected', 'error']
+    response: CodeResponse | None = None
+    detail: str | None = None
+    retry_after: int | None = None
+
+
+class BatchResponse(BaseModel):
+    results: list[BatchItemResult]
+
+
+class JobRequest(BaseModel):
+    code: str
+    tier: Literal['standard', 'long', 'extended'] = 'standard'
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: Literal['queued', 'running', 'done', 'failed', 'cancelled']
+    tier: str
+    created_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+    # Jobs queued ahead of this one, while it is queued
+    position: int | None = None
+    error: str | None = None
+
+
+class OutputPage(BaseModel):
+    handle: str
+    text: str
+    total_bytes: int
+    next_offset: int | None = None
+    next_line: int | None = None
+
+
+class SessionResponse(BaseModel):
+    session_id: str
+    idle_ttl_seconds: float
+
+
+class CellResponse(BaseModel):
+    output: str
+    success: bool
+    error_message: str | None = None
+    cell: int
+
+
+def build_code_response(result: ExecutionResult, timeout: float = WALL_TIMEOUT_SECONDS) -> CodeResponse:
+    metrics.observe_execution(result)
+    if result.timed_out:
+        logger.warning("Code execution timeout")
+        return CodeResponse(
+            stdout="",
+            stderr=f"Execution timeout: Code took longer than {timeout:g} seconds to execute",
+            success=False,
+            error_message=f"Timeout after {timeout:g} seconds"
+        )
+
+    # Log first 500 chars of output for debugging, for a rate-limited sample of runs
+    if preview_log_sampler.should_log():
+        logger.info(f"Execution completed with return code {result.returncode}")
+        logger.info(f"STDOUT length: {len(result.stdout)}, STDERR length: {len(result.stderr)}")
+        if result.stdout:
+            logger.info(f"STDOUT preview: {result.stdout[:500]}")
+        if result.stderr:
+            logger.info(f"STDERR preview: {result.stderr[:500]}")
+    
+    # M2 --stop outputs banner to stderr, which is not an error
+    # Only keep stderr if there's an actual error (non-zero return code)
+    stderr_output = result.stderr if result.returncode != 0 else ""
+    
+    error_message = None
+    if result.returncode != 0:
+        error_lines = stderr_error_lines(stderr_output)
+        if error_lines:
+            error_message = f"Macaulay2 error:\n" + '\n'.join(error_lines)
+        else:
+            error_message = f"Process exited with code {result.returncode}"
+    
+    response = CodeResponse(
+        stdout=result.stdout,
+        stderr=stderr_output,
+        success=result.returncode == 0,
+        error_message=error_message,
+        output_truncated=result.output_truncated,
+    )
+    if result.output_handle:
+        response.output_handle = result.output_handle
+        response.output_bytes = result.output_bytes
+    return response
+
+
+def as_cells(response: CodeResponse) -> CodeResponse:
+    cells = parse_transcript(response.stdout, stderr_error_lines(response.stderr))
+    return response.model_copy(update={"stdout": "", "cells": [TranscriptCell(**vars(cell)) for cell in cells]})
+
+
+def cpu_throttle(client: str, timeout: float) -> tuple[bool, float]:
+    """Whether the client is over its CPU budget, and the timeout its run gets"""
+    if not cpu_budgets.over_budget(client):
+        return False, timeout
+    metrics.throttled_runs.inc()
+    return True, min(timeout, config.CPU_BUDGET_THROTTLED_TIMEOUT_SECONDS)
+
+
+def validate_code(code: str):
+    if not code.strip():
+        raise HTTPException(status_code=400, detail="Code cannot be empty")
+    
+    # Basic input validation
+    if len(code) > 100000:  # 100KB limit
+        raise HTTPException(status_code=400, detail="Code too long (max 100KB)")
 
 
 @app.post("/execute", response_model=CodeResponse)
-async def execute_code(request: CodeRequest):
+async def execute_code(request: CodeRequest, http_request: Request):
     """
     Execute Macaulay2 code with resource limits and security measures.
     
     Resource limits:
-    - 30 seconds CPU time
-    - 512MB memory
+    - 120 seconds CPU time
+    - 2GB address space
     - 35 seconds wall-clock timeout
-    - Isolated temporary directory
+    - Isolated temporary directory per pre-started interpreter
+
+    Responses of at least M2_COMPRESSION_MIN_BYTES are compressed when the client sends
+    `Accept-Encoding: zstd` or `gzip`. With `Accept: application/msgpack` the response is
+    msgpack instead of JSON, without empty fields and without stderr when error_message
+    already carries its errors.
     """
-    if not request.code.strip():
-        raise HTTPException(status_code=400, detail="Code cannot be empty")
-    
-    # Basic input validation
-    if len(request.code) > 100000:  # 100KB limit
-        raise HTTPException(status_code=400, detail="Code too long (max 100KB)")
-    
-    # Create isolated temporary directory for execution
-    with tempfile.TemporaryDirectory() as temp_dir:
+    validate_code(request.code)
+    try:
+        response = await run_code(request, client_ip(http_request))
+        if wants_msgpack(http_request.headers.get("accept", "")):
+            return Response(content=pack_msgpack(response.model_dump()), media_type=MSGPACK_MEDIA_TYPES[0])
+        return response
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail,
+                            headers={"Retry-After": str(e.retry_after)})
+    except FileNotFoundError:
+        logger.error("M2 command not found")
+        raise HTTPException(
+            status_code=500, 
+            detail="Macaulay2 not found. Please ensure M2 is installed and in PATH."
+        )
+    except Exception as e:
+        logger.error(f"Execution error: {e}")
+        raise HTTPException(status_code=500, detail=f"Execution error: {str(e)}")
+
+
+async def run_code(request: CodeRequest, client: str, timeout: float = WALL_TIMEOUT_SECONDS) -> CodeResponse:
+    """Cache lookup, admission and execution of one validated request; errors are left to the caller"""
+    arrival = time.time()
+    syntax_error = check_syntax(request.code) if config.PREFLIGHT_MODE != "off" else None
+    if syntax_error:
+        metrics.preflight_errors.inc(mode=config.PREFLIGHT_MODE)
+        if config.PREFLIGHT_MODE == "strict":
+            trace_recorder.record(request.code, client, arrival, "syntax_error", time.time() - arrival)
+            response = CodeResponse(stdout="", stderr=syntax_error + "\n", success=False,
+                                    error_message=f"Macaulay2 error:\n{syntax_error}", syntax_error=syntax_error)
+            return as_cells(response) if request.format == 'cells' else response
+
+    if request.profile and not syntax_error and split_statements(request.code):
+        throttled, timeout = cpu_throttle(client, timeout)
         try:
-            # Macaulay2 command using stdin method
-            # This is the only method that produces output reliably
-            # --stop: non-interactive mode, exit after processing
-            # We send code via stdin and add "exit" to ensure clean termination
-            
+            async with scheduler.slot(client, request.code, throttled):
+                logger.info(f"Profiling Macaulay2 code ({len(request.code)} bytes)")
+                result, cells = await run_profiled(request.code, timeout)
+        except AdmissionRejected:
+            trace_recorder.record(request.code, client, arrival, "rejected", time.time() - arrival)
+            raise
+        except Exception:
+            trace_recorder.record(request.code, client, arrival, "server_error", time.time() - arrival)
+            raise
+        trace_recorder.record(request.code, client, arrival, result.outcome, time.time() - arrival,
+                              result.wall_seconds, result.cpu_seconds, result.output_bytes)
+        cpu_budgets.charge(client, result.cpu_seconds)
+        for cell in cells:
+            stats_store.record_cell(cell["kind"], cell["wall_seconds"], cell["cpu_seconds"] or 0.0,
+                                    cell["memory_growth_bytes"] or 0)
+        response = build_code_response(result, timeout)
+        response.throttled = throttled
+        response.profile = ProfileReport(cells=cells, wall_seconds=result.wall_seconds,
+                                         cpu_seconds=result.cpu_seconds, peak_rss_bytes=result.peak_rss_bytes)
+        return as_cells(response) if request.format == 'cells' else response
+
+    cache_key = result_cache.key_for(request.code)
+    if cache_key:
+        cached = await result_cache.get(cache_key)
+        if cached:
+            metrics.cache_hits.inc()
+            response = CodeResponse(**cached, cached=True, syntax_error=syntax_error)
+            trace_recorder.record(request.code, client, arrival, "cached", time.time() - arrival,
+                                  output_bytes=len(response.stdout.encode('utf-8')))
+            return as_cells(response) if request.format == 'cells' else response
+
+    throttled, timeout = cpu_throttle(client, timeout)
+    try:
+        async with scheduler.slot(client, request.code, throttled):
             logger.info(f"Executing Macaulay2 code ({len(request.code)} bytes)")
-            logger.info(f"Command: M2 --stop (via stdin)")
-            
-            result = subprocess.run(
-                ['M2', '--stop'],
-                input=request.code + "\nexit\n",
-                cwd=temp_dir,  # Run in isolated directory
-                capture_output=True,
-                text=True,
-                timeout=35,  # Wall-clock timeout
-                preexec_fn=set_resource_limits if os.name != 'nt' else None,  # Skip on Windows
-            )
-            
-            logger.info(f"Execution completed with return code {result.returncode}")
-            logger.info(f"STDOUT length: {len(result.stdout)}, STDERR length: {len(result.stderr)}")
-            
-            # Log first 500 chars of output for debugging
-            if result.stdout:
-                logger.info(f"STDOUT preview: {result.stdout[:500]}")
-            if result.stderr:
-                logger.info(f"STDERR preview: {result.stderr[:500]}")
-            
-            # M2 --stop outputs banner to stderr, which is not an error
-            # Only keep stderr if there's an actual error (non-zero return code)
-            stderr_output = result.stderr if result.returncode != 0 else ""
-            
-            # Create detailed error message including stderr content
-            error_message = None
-            if result.returncode != 0:
-                if stderr_output.strip():
-                    # Clean up stderr: extract version and actual error
-                    lines = stderr_output.strip().split('\n')
-                    version_line = None
-                    error_lines = []
-                    in_packages = False
-                    
-                    for line in lines:
-                        if line.startswith('Macaulay2, version'):
-                            version_line = line.strip()
-                        elif 'with packages:' in line:
-                            in_packages = True
-                            continue
-                        elif in_packages:
-                            # Skip package list line(s) - they don't start with known prefixes
-                            if line.strip() and not any(line.strip().startswith(prefix) for prefix in ['stdio:', 'error:', '--']):
+            result = await execution_strategy.execute(request.code, timeout, capture=output_store.capture())
+    except AdmissionRejected:
+        trace_recorder.record(request.code, client, arrival, "rejected", time.time() - arrival)
+        raise
+    except Exception:
+        trace_recorder.record(request.code, client, arrival, "server_error", time.time() - arrival)
+        raise
+    trace_recorder.record(request.code, client, arrival, result.outcome, time.time() - arrival, result.wall_seconds,
+                          result.cpu_seconds, result.output_bytes)
+    cpu_budgets.charge(client, result.cpu_seconds)
+
+    response = build_code_response(result, timeout)
+    response.syntax_error = syntax_error
+    response.throttled = throttled
+    # Only the code's own outcome is replayed: a timeout or a kill (OOM, limits, shutdown) may not happen next time.
+    # A spilled output outlives its file only as a head, so it is not worth replaying
+    if cache_key and result.outcome in ("success", "error") and not result.output_handle:
+        await result_cache.put(cache_key, response.model_dump(exclude={'cached', 'cells', 'syntax_error', 'throttled'}))
+    return as_cells(response) if request.format == 'cells' else response
+
+
+async def run_profiled(code: str, timeout: float) -> tuple[ExecutionResult, list[dict]]:
+    """
+    Run `code` with a probe after each top-level statement and return the result, with
+    the probes' output removed, and one profile per cell. Stdout beyond
+    M2_STREAM_MAX_BYTES is dropped but still read, so the later probes are seen.
+    """
+    statements = split_statements(code)
+    reader = ProbeReader(package_index.symbols)
+    loop = asyncio.get_running_loop()
+    async with m2_pool.process() as slot:
+        preamble = package_index.preamble(code) if package_index.ready else ""
+        output = OutputStream(slot.process, instrument(statements, preamble), timeout,
+                              spawn_seconds=slot.acquire_seconds)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        pid = slot.process.pid
+        stdout = []
+        kept = 0
+        async with aclosing(output.chunks()) as chunks:
+            async for chunk in chunks:
+                text = decoder.decode(chunk)
+                reader.feed(text, loop.time(), lambda: read_rss(pid))
+                if kept + len(chunk) > config.STREAM_MAX_BYTES:
+                    output.result.output_truncated = True
+                    continue
+                kept += len(chunk)
+                stdout.append(text)
+        stdout.append(decoder.decode(b'', final=True))
+    result = output.result
+    result.stdout = strip_probes("".join(stdout))
+    return result, reader.cells(statements, loop.time())
+
+
+async def run_batch_item(index: int, request: CodeRequest, client: str, timeout: float,
+                         parallel: asyncio.Semaphore) -> BatchItemResult:
+    try:
+        validate_code(request.code)
+        async with parallel:
+            response = await run_code(request, client, timeout)
+        return BatchItemResult(index=index, status="ok", response=response)
+    except HTTPException as e:
+        return BatchItemResult(index=index, status="invalid", detail=e.detail)
+    except AdmissionRejected as e:
+        return BatchItemResult(index=index, status="rejected", detail=e.detail, retry_after=e.retry_after)
+    except FileNotFoundError:
+        logger.error("M2 command not found")
+        return BatchItemResult(index=index, status="error", detail="Macaulay2 not found. Please ensure M2 is installed and in PATH.")
+    except Exception as e:
+        logger.error(f"Execution error in batch item {index}: {e}")
+        return BatchItemResult(index=index, status="error", detail=f"Execution error: {str(e)}")
+
+
+async def stream_batch(tasks: list[asyncio.Task]):
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield sse_event("item", (await finished).model_dump())
+        yield sse_event("done", {"items": len(tasks)})
+    finally:
+        # The client went away, nobody is waiting for the rest
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/execute/batch", response_model=BatchResponse)
+async def execute_batch(request: BatchRequest, http_request: Request):
+    """
+    Execute many independent snippets at once, at most M2_BATCH_MAX_PARALLEL of them
+    at a time and each under `timeout_seconds` and the usual resource limits.
+
+    Results come back in request order, each with its own status (`ok`, `invalid`,
+    `rejected` when the queue turned it away, `error`). With `"stream": true` they are
+    sent as Server-Sent Events instead, one `item` event per snippet as it completes,
+    then `done`.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch cannot be empty")
+    if len(request.items) > config.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch too large (max {config.BATCH_MAX_ITEMS} items)")
+
+    client = client_ip(http_request)
+    parallel = asyncio.Semaphore(config.BATCH_MAX_PARALLEL)
+    tasks = [
+        asyncio.create_task(run_batch_item(index, item, client, request.timeout_seconds, parallel))
+        for index, item in enumerate(request.items)
+    ]
+    if request.stream:
+        return StreamingResponse(
+            stream_batch(tasks),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    try:
+        return BatchResponse(results=await asyncio.gather(*tasks))
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@app.get("/outputs/{handle}", response_model=OutputPage)
+async def get_output_page(handle: str, offset: int = Query(0, ge=0),
+                          length: int = Query(1_000_000, ge=1, le=10_000_000),
+                          line: int | None = Query(None, ge=0), lines: int = Query(1000, ge=1, le=100_000)):
+    """
+    A page of a spilled output: `length` bytes from `offset`, or `lines` lines from
+    line number `line` when it is given. Follow `next_offset` / `next_line` for the next page.
+    """
+    try:
+        if line is None:
+            data, total, next_offset = await output_store.read_bytes(handle, offset, length)
+            return OutputPage(handle=handle, text=data.decode('utf-8', errors='replace'),
+                              total_bytes=total, next_offset=next_offset)
+        data, total, next_line = await output_store.read_lines(handle, line, lines)
+        return OutputPage(handle=handle, text=data.decode('utf-8', errors='replace'),
+                          total_bytes=total, next_line=next_line)
+    except (OutputNotFound, FileNotFoundError):
+        # FileNotFoundError: the sweep removed the file between the lookup and the read
+        raise HTTPException(status_code=404, detail="Output not found or expired")
+
+
+def job_status(job: dict) -> JobStatus:
+    return JobStatus(job_id=job["id"], **{k: v for k, v in job.items() if k in JobStatus.model_fields})
+
+
+@app.post("/jobs", response_model=JobStatus, status_code=202)
+async def submit_job(request: JobRequest, http_request: Request):
+    """
+    Queue Macaulay2 code as a background job and return at once. Poll
+    GET /jobs/{job_id} until it is done, then fetch GET /jobs/{job_id}/result.
+    Longer tiers allow more wall-clock and CPU time than /execute.
+    """
+    validate_code(request.code)
+    client = client_ip(http_request)
+    if await asyncio.to_thread(job_store.queued_for, client) >= config.JOB_MAX_ACTIVE_PER_CLIENT:
+        raise HTTPException(status_code=429, detail="Too many unfinished jobs from this client")
+    job_id = await asyncio.to_thread(job_store.submit, request.code, client, request.tier)
+    return job_status(await asyncio.to_thread(job_store.get, job_id))
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job_status(job)
+
+
+@app.get("/jobs/{job_id}/result", response_model=CodeResponse)
+async def get_job_result(job_id: str):
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return CodeResponse(**await asyncio.to_thread(job_store.result, job_id))
+
+
+@app.delete("/jobs/{job_id}", response_model=JobStatus)
+async def cancel_job(job_id: str):
+    """Cancel a job; a running one is stopped within one heartbeat interval"""
+    if await asyncio.to_thread(job_store.cancel, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job_status(await asyncio.to_thread(job_store.get, job_id))
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def block_event(block) -> str:
+    if isinstance(block, str):
+        return sse_event("chunk", {"text": block})
+    return sse_event("cell", vars(block))
+
+
+async def stream_execution(code: str, client: str, format: str = 'text'):
+    syntax_error = check_syntax(code) if config.PREFLIGHT_MODE == "strict" else None
+    if syntax_error:
+        metrics.preflight_errors.inc(mode=config.PREFLIGHT_MODE)
+        yield sse_event("done", {"stderr": syntax_error + "\n", "success": False,
+                                 "error_message": f"Macaulay2 error:\n{syntax_error}"})
+        return
+    throttled, timeout = cpu_throttle(client, WALL_TIMEOUT_SECONDS)
+    try:
+        async with scheduler.slot(client, code, throttled), m2_pool.process() as slot:
+            preamble = package_index.preamble(code) if package_index.ready else ""
+            output = OutputStream(slot.process, f"{preamble}\n{code}" if preamble else code, timeout,
+                                  spawn_seconds=slot.acquire_seconds)
+            try:
+                decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+                splitter = TranscriptParser() if format == 'cells' else PromptSplitter()
+                # The first block is the injected needsPackage line, not the user's
+                hidden = 1 if preamble else 0
+                streamed = 0
+                async with aclosing(output.chunks()) as chunks:
+                    async for chunk in chunks:
+                        streamed += len(chunk)
+                        if streamed > config.STREAM_MAX_BYTES:
+                            yield sse_event("truncated", {"max_bytes": config.STREAM_MAX_BYTES})
+                            return
+                        for block in splitter.feed(decoder.decode(chunk)):
+                            if hidden:
+                                hidden -= 1
                                 continue
-                            else:
-                                in_packages = False
-                        
-                        # Collect actual error lines
-                        if line.strip() and not line.startswith('Macaulay2, version') and 'with packages:' not in line:
-                            error_lines.append(line)
-                    
-                    # Build clean error message
-                    if error_lines:
-                        error_message = f"Macaulay2 error:\n" + '\n'.join(error_lines)
-                    else:
-                        error_message = f"Process exited with code {result.returncode}"
+                            yield block_event(block)
+                tail = splitter.feed(decoder.decode(b'', final=True))
+                if format == 'cells':
+                    errors = stderr_error_lines(output.result.stderr) if output.result.returncode != 0 else []
+                    tail += splitter.finish(errors)
                 else:
-                    error_message = f"Process exited with code {result.returncode}"
-            
-            return CodeResponse(
-                stdout=result.stdout,
-                stderr=stderr_output,
-                success=result.returncode == 0,
-                error_message=error_message
-            )
-        
-        except subprocess.TimeoutExpired:
-            logger.warning("Code execution timeout")
-            return CodeResponse(
-                stdout="",
-                stderr="Execution timeout: Code took longer than 35 seconds to execute",
-                success=False,
-                error_message="Timeout after 35 seconds"
-            )
-        
-        except FileNotFoundError:
-            logger.error("M2 command not found")
-            raise HTTPException(
-                status_code=500, 
-                detail="Macaulay2 not found. Please ensure M2 is installed and in PATH."
-            )
-        
-        except Exception as e:
-            logger.error(f"Execution error: {e}")
-            raise HTTPException(status_code=500, detail=f"Execution error: {str(e)}")
+                    tail += splitter.flush()
+                for block in tail[hidden:]:
+                    yield block_event(block)
+                done = build_code_response(output.result, timeout)
+                done.throttled = throttled
+                yield sse_event("done", done.model_dump(include={'stderr', 'success', 'error_message', 'throttled'}))
+            finally:
+                # Truncated, timed out or abandoned by the client, the run still used its CPU
+                cpu_budgets.charge(client, output.result.cpu_seconds)
+    except AdmissionRejected as e:
+        yield sse_event("error", {"status": e.status_code, "detail": e.detail, "retry_after": e.retry_after})
+    except FileNotFoundError:
+        logger.error("M2 command not found")
+        yield sse_event("error", {"status": 500, "detail": "Macaulay2 not found. Please ensure M2 is installed and in PATH."})
+
+
+@app.post("/execute/stream")
+async def execute_code_stream(request: CodeRequest, http_request: Request):
+    """
+    Execute Macaulay2 code and stream the output as Server-Sent Events.
+
+    Each `chunk` event carries one `iN :` block as soon as M2 has printed it
+    (with `"format": "cells"`, a `cell` event carries the parsed cell instead),
+    `done` carries the exit status, `truncated` is sent when the output exceeds
+    the streaming limit and `error` when the run could not start. Disconnecting
+    kills the M2 process.
+    """
+    validate_code(request.code)
+    return StreamingResponse(
+        stream_execution(request.code, client_ip(http_request), request.format),
+        media_type="text/event-stream",
+        # nginx would otherwise buffer the whole response before forwarding it
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def readiness() -> tuple[bool, list[str]]:
+    reasons = []
+    if not health_prober.probe_ok:
+        reasons.append(f"M2 probe failing: {health_prober.error}")
+    elif not health_prober.is_fresh():
+        reasons.append("M2 probe is stale")
+    queue = scheduler.stats()
+    if queue["queued"] - queue["queued_background"] >= queue["max_queue"]:
+        reasons.append("Execution queue is full")
+    pool = m2_pool.stats()
+    if pool["idle"] == 0 and pool["in_use"] >= pool["max_size"]:
+        reasons.append("Warm pool is exhausted")
+    return not reasons, reasons
+
+
+@app.post("/sessions", response_model=SessionResponse)
+async def create_session():
+    """
+    Start a persistent M2 interpreter. Definitions survive between cells, so only
+    new code has to be sent. The interpreter keeps the usual resource limits for
+    its whole lifetime and is closed after the idle TTL or when the session cap
+    forces out the least recently used session.
+    """
+    try:
+        session = await session_manager.create()
+    except FileNotFoundError:
+        raise HTTPException(status_code=500, detail="Macaulay2 not found. Please ensure M2 is installed and in PATH.")
+    except (SessionEnded, asyncio.TimeoutError):
+        raise HTTPException(status_code=500, detail="Macaulay2 session failed to start")
+    except SessionLimitReached:
+        raise HTTPException(status_code=503, detail="Too many sessions starting, try again shortly",
+                            headers={"Retry-After": "5"})
+    return SessionResponse(session_id=session.id, idle_ttl_seconds=session_manager.idle_ttl_seconds)
+
+
+@app.post("/sessions/{session_id}/execute", response_model=CellResponse)
+async def execute_in_session(session_id: str, request: CodeRequest, http_request: Request):
+    validate_code(request.code)
+    client = client_ip(http_request)
+    try:
+        # Over budget, a session cell still queues last, but keeps its timeout: a timeout ends the session
+        async with scheduler.slot(client, request.code, cpu_budgets.over_budget(client)):
+            session, output = await session_manager.execute(session_id, request.code)
+        cpu_budgets.charge(client, session.cell_cpu_seconds)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail,
+                            headers={"Retry-After": str(e.retry_after)})
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    except SessionEnded as e:
+        raise HTTPException(status_code=410, detail=f"Session ended:\n{e}")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=410, detail=f"Cell timed out after {WALL_TIMEOUT_SECONDS} seconds; session closed")
+
+    errors = error_lines(output)
+    return CellResponse(
+        output=output,
+        success=not errors,
+        error_message="Macaulay2 error:\n" + "\n".join(errors) if errors else None,
+        cell=session.cells,
+    )
+
+
+@app.post("/sessions/{session_id}/reset", response_model=SessionResponse)
+async def reset_session(session_id: str):
+    """Replace the interpreter behind a session with a fresh one, dropping all definitions"""
+    try:
+        session = await session_manager.reset(session_id)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return SessionResponse(session_id=session.id, idle_ttl_seconds=session_manager.idle_ttl_seconds)
+
+
+@app.delete("/sessions/{session_id}")
+async def close_session(session_id: str):
+    try:
+        await session_manager.close(session_id)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"closed": session_id}
 
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    # Check if Macaulay2 is available
-    try:
-        result = subprocess.run(
-            ['M2', '--version'],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        m2_available = result.returncode == 0
-        m2_version = result.stdout.strip().split('\n')[0] if m2_available else None
-    except (FileNotFoundError, subprocess.TimeoutExpired):
-        m2_available = False
-        m2_version = None
-    
+    """Health check endpoint, answered from the last background probe"""
+    ready, reasons = readiness()
     return {
         "status": "healthy",
-        "macaulay2_available": m2_available,
-        "macaulay2_version": m2_version,
+        "ready": ready,
+        "not_ready_reasons": reasons,
+        **health_prober.snapshot(),
         "resource_limits": {
-            "timeout_seconds": 35,
-            "memory_limit_mb": 512,
-            "cpu_time_limit_seconds": 30
-        }
+            "sandbox": sandbox_mode(),
+            "lean_startup": package_index.ready,
+            "timeout_seconds": WALL_TIMEOUT_SECONDS,
+            "memory_limit_mb": MEMORY_LIMIT_BYTES // 1_000_000,
+            "cpu_time_limit_seconds": CPU_LIMIT_SECONDS,
+        },
+        "pool": m2_pool.stats(),
+        "queue": scheduler.stats(),
+        "result_cache": result_cache.stats(),
+        "sessions": session_manager.stats(),
+        "outputs": output_store.stats(),
+        "workspaces": workspaces.stats(),
+        "jobs": await asyncio.to_thread(job_store.stats),
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text exposition of execution latency, resource usage and outcomes"""
+    for component, values in [("pool", m2_pool.stats()), ("queue", scheduler.stats())]:
+        for state in ("idle", "in_use", "running", "running_slow", "queued", "queued_fast", "queued_throttled"):
+            if state in values:
+                metrics.service_state.set(values[state], component=component, state=state)
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health/live")
+async def liveness():
+    """The API process is up and its event loop is responsive"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Whether this instance should receive /execute traffic right now"""
+    ready, reasons = readiness()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "reasons": reasons, **health_prober.snapshot()},
+    )
+
+
 @app.post("/test-m2")
 async def test_m2():
     """
     Test endpoint to verify M2 execution with simple code
-    Tries multiple execution methods
+    Runs it through every execution strategy
     """
     test_code = "2+2"
     results = {}
-    
-    # Method 1: stdin
-    try:
-        result = subprocess.run(
-            ['M2', '-q', '--stop'],
-            input=test_code + "\nexit\n",
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        results["stdin_method"] = {
-            "returncode": result.returncode,
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "stdout_length": len(result.stdout),
-            "stderr_length": len(result.stderr),
-        }
-    except Exception as e:
-        results["stdin_method"] = {"error": str(e)}
-    
-    # Method 2: script file
-    try:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            code_file = Path(temp_dir) / "test.m2"
-            code_file.write_text(test_code, encoding='utf-8')
-            
-            result = subprocess.run(
-                ['M2', '--script', str(code_file)],
-                cwd=temp_dir,
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            results["script_method"] = {
-                "returncode": result.returncode,
-                "stdout": result.stdout,
-                "stderr": result.stderr,
-                "stdout_length": len(result.stdout),
-                "stderr_length": len(result.stderr),
-            }
-    except Exception as e:
-        results["script_method"] = {"error": str(e)}
-    
-    # Method 3: quiet script
-    try:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            code_file = Path(temp_dir) / "test.m2"
-            code_file.write_text(test_code, encoding='utf-8')
-            
-            result = subprocess.run(
-                ['M2', '-q', '--script', str(code_file)],
-                cwd=temp_dir,
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            results["quiet_script_method"] = {
+    for name, strategy in strategies.items():
+        try:
+            result = await strategy.execute(test_code, timeout=5)
+            results[f"{name}_method"] = {
                 "returncode": result.returncode,
                 "stdout": result.stdout,
                 "stderr": result.stderr,
                 "stdout_length": len(result.stdout),
                 "stderr_length": len(result.stderr),
+                "wall_seconds": result.wall_seconds,
             }
-    except Exception as e:
-        results["quiet_script_method"] = {"error": str(e)}
-    
+        except Exception as e:
+            results[f"{name}_method"] = {"error": str(e)}
+    results["active_strategy"] = config.EXECUTION_STRATEGY
     return results
 
 
-
 if __name__ == "__main__":
     import uvicorn
     import argparse
@@ -0,0 +1,152 @@
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from executor import ExecutionResult
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 35, 60, 120)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9, 2e9)
+RATIO_BUCKETS = (0.1, 0.25, 0.5, 0.8, 1.25, 2, 4, 10, 100)
+
+
+def format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    TYPE = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.TYPE}"]
+        lines += [f"{self.name}{format_labels(self.labels, key)} {value}" for key, value in self._values.items()]
+        return lines
+
+
+class Gauge(Counter):
+    TYPE = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[tuple(labels[name] for name in self.labels)] = value
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        series = self._series.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                labels = format_labels((*self.labels, "le"), (*key, bound))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+executions = registry.register(Counter(
+    "m2_executions_total", "M2 runs by outcome (success, error, timeout, cpu_limit, memory_limit, ...)", ("outcome",)))
+spawn_seconds = registry.register(Histogram(
+    "m2_spawn_seconds", "Time to obtain a started M2 process", SECONDS_BUCKETS, ("outcome",)))
+first_byte_seconds = registry.register(Histogram(
+    "m2_time_to_first_byte_seconds", "Time from sending code to the first byte of stdout", SECONDS_BUCKETS, ("outcome",)))
+wall_seconds = registry.register(Histogram(
+    "m2_wall_seconds", "Wall-clock time of a run", SECONDS_BUCKETS, ("outcome",)))
+cpu_seconds = registry.register(Histogram(
+    "m2_cpu_seconds", "User plus system CPU time of a run, without a warm interpreter's startup", SECONDS_BUCKETS, ("outcome",)))
+peak_rss_bytes = registry.register(Histogram(
+    "m2_peak_rss_bytes", "Peak resident set size of a run", BYTES_BUCKETS, ("outcome",)))
+output_bytes = registry.register(Histogram(
+    "m2_output_bytes", "Bytes written to stdout by a run", BYTES_BUCKETS, ("outcome",)))
+cache_hits = registry.register(Counter(
+    "m2_result_cache_hits_total", "Responses served from the result cache"))
+preflight_errors = registry.register(Counter(
+    "m2_preflight_syntax_errors_total", "Snippets the pre-flight check found broken, by mode", ("mode",)))
+predicted_seconds = registry.register(Histogram(
+    "m2_predicted_runtime_seconds", "Runtime the scheduler predicted before admitting a job, by lane",
+    SECONDS_BUCKETS, ("lane",)))
+prediction_ratio = registry.register(Histogram(
+    "m2_runtime_prediction_ratio", "Actual over predicted runtime of admitted jobs, by the lane they ended in",
+    RATIO_BUCKETS, ("lane",)))
+demotions = registry.register(Counter(
+    "m2_scheduler_demotions_total", "Fast-lane jobs moved to the slow lane after overrunning their prediction"))
+throttled_runs = registry.register(Counter(
+    "m2_cpu_budget_throttled_total", "Runs from clients over their CPU budget, queued last with a shorter timeout"))
+service_state = registry.register(Gauge(
+    "m2_service_state", "Current pool and queue occupancy", ("component", "state")))
+
+
+def observe_execution(result: ExecutionResult):
+    outcome = result.outcome
+    executions.inc(outcome=outcome)
+    spawn_seconds.observe(result.spawn_seconds, outcome=outcome)
+    if result.first_byte_seconds is not None:
+        first_byte_seconds.observe(result.first_byte_seconds, outcome=outcome)
+    wall_seconds.observe(result.wall_seconds, outcome=outcome)
+    cpu_seconds.observe(result.cpu_seconds, outcome=outcome)
+    if result.peak_rss_bytes:
+        peak_rss_bytes.observe(result.peak_rss_bytes, outcome=outcome)
+    output_bytes.observe(result.output_bytes, outcome=outcome)
+
+
+class LogSampler:
+    """Lets a fraction of events through, and never more than `max_per_minute` of them"""
+
+    def __init__(self, sample_rate: float, max_per_minute: int):
+        self.sample_rate = sample_rate
+        self.max_per_minute = max_per_minute
+        self._tokens = float(max_per_minute)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def should_log(self) -> bool:
+        if random.random() >= self.sample_rate:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.max_per_minute, self._tokens + (now - self._last) * self.max_per_minute / 60)
+            self._last = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
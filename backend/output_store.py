@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import mmap
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+HANDLE = re.compile(r'^[A-Za-z0-9_-]{24}$')
+# Every LINE_INDEX_STRIDE-th line start is remembered, so a line page scans at most that many lines
+LINE_INDEX_STRIDE = 1024
+LINE_INDEX_CACHE_SIZE = 16
+
+
+class OutputNotFound(Exception):
+    pass
+
+
+class SpooledOutput:
+    """
+    Collects the stdout of one run in memory up to `threshold` bytes. Past that the
+    bytes go to a file in `directory` and only the first `head_bytes` stay in memory.
+    Anything beyond `max_bytes` is dropped and `truncated` is set.
+    """
+
+    def __init__(self, directory: str, threshold: int, head_bytes: int, max_bytes: int):
+        self.directory = directory
+        self.threshold = threshold
+        self.head_bytes = head_bytes
+        self.max_bytes = max_bytes
+        self.handle: str | None = None
+        self.size = 0
+        self.truncated = False
+        self._buffer = bytearray()
+        self._file = None
+
+    def write(self, chunk: bytes):
+        room = self.max_bytes - self.size
+        if len(chunk) > room:
+            chunk = chunk[:room]
+            self.truncated = True
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self._file is None:
+            self._buffer += chunk
+            if len(self._buffer) > self.threshold:
+                self._spill()
+        else:
+            # One read chunk into the page cache; cheaper than a thread hop per chunk
+            self._file.write(chunk)
+
+    def close(self):
+        """Publish the spilled file under its handle once the run is over"""
+        if self._file is not None:
+            self._file.close()
+            os.replace(self._partial_path(), os.path.join(self.directory, self.handle))
+
+    def discard(self):
+        if self._file is not None:
+            self._file.close()
+            try:
+                os.unlink(self._partial_path())
+            except FileNotFoundError:
+                pass
+            self.handle = None
+
+    def head(self) -> str:
+        data = bytes(self._buffer)
+        if self._file is not None:
+            # Cut at a line break so the head never ends in half a line or half a character
+            cut = data.rfind(b'\n')
+            if cut > 0:
+                data = data[:cut + 1]
+        return data.decode('utf-8', errors='replace')
+
+    def _spill(self):
+        self.handle = secrets.token_urlsafe(18)
+        self._file = open(self._partial_path(), 'wb')
+        self._file.write(self._buffer)
+        del self._buffer[self.head_bytes:]
+
+    def _partial_path(self) -> str:
+        return os.path.join(self.directory, f".{self.handle}.partial")
+
+
+class OutputStore:
+    """
+    Outputs too large for a JSON response, kept as files in `directory` and served in
+    byte or line pages through mmap. The files are the only state, so any worker can
+    serve any handle; a sweep deletes them `ttl_seconds` after they were written.
+    """
+
+    def __init__(self, directory: str, threshold: int, head_bytes: int, max_bytes: int,
+                 ttl_seconds: float, sweep_interval: float):
+        self.directory = directory
+        self.threshold = threshold
+        self.head_bytes = head_bytes
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+        self._line_indexes: OrderedDict[str, list[int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweep_task: asyncio.Task | None = None
+        self.expired = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def capture(self) -> SpooledOutput:
+        return SpooledOutput(self.directory, self.threshold, self.head_bytes, self.max_bytes)
+
+    async def start(self):
+        self._sweep_task = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self):
+        if self._sweep_task:
+            self._sweep_task.cancel()
+
+    async def read_bytes(self, handle: str, offset: int, length: int) -> tuple[bytes, int, int | None]:
+        """Bytes [offset, offset + length), the file size and the offset of the next page"""
+        return await asyncio.to_thread(self._read_bytes, self._path(handle), offset, length)
+
+    async def read_lines(self, handle: str, start: int, count: int) -> tuple[bytes, int, int | None]:
+        """Lines [start, start + count), the file size and the number of the next line"""
+        path = self._path(handle)
+        return await asyncio.to_thread(self._read_lines, handle, path, start, count)
+
+    def stats(self) -> dict:
+        return {"expired": self.expired, "ttl_seconds": self.ttl_seconds}
+
+    def sweep(self):
+        cutoff = time.time() - self.ttl_seconds
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    self.expired += 1
+                    with self._lock:
+                        self._line_indexes.pop(entry.name, None)
+            except FileNotFoundError:
+                pass
+
+    def _path(self, handle: str) -> str:
+        if not HANDLE.match(handle):
+            raise OutputNotFound(handle)
+        path = os.path.join(self.directory, handle)
+        if not os.path.exists(path):
+            raise OutputNotFound(handle)
+        return path
+
+    def _read_bytes(self, path: str, offset: int, length: int) -> tuple[bytes, int, int | None]:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            size = len(m)
+            end = min(size, offset + length)
+            # Move both edges back to a character boundary so pages decode cleanly
+            while 0 < offset < size and m[offset] & 0xC0 == 0x80:
+                offset -= 1
+            while offset < end < size and m[end] & 0xC0 == 0x80:
+                end -= 1
+            return m[offset:end], size, end if end < size else None
+
+    def _read_lines(self, handle: str, path: str, start: int, count: int) -> tuple[bytes, int, int | None]:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            size = len(m)
+            index = self._line_index(handle, m)
+            block = start // LINE_INDEX_STRIDE
+            if block >= len(index):
+                return b'', size, None
+            begin = index[block]
+            for _ in range(start - block * LINE_INDEX_STRIDE):
+                begin = m.find(b'\n', begin) + 1
+                if begin == 0:
+                    return b'', size, None
+            end = begin
+            for _ in range(count):
+                end = m.find(b'\n', end) + 1
+                if end == 0:
+                    end = size
+                    break
+            return m[begin:end], size, start + count if end < size else None
+
+    def _line_index(self, handle: str, m: mmap.mmap) -> list[int]:
+        with self._lock:
+            index = self._line_indexes.get(handle)
+            if index is not None:
+                self._line_indexes.move_to_end(handle)
+                return index
+        index = [0]
+        lines = 0
+        pos = m.find(b'\n')
+        while 0 <= pos < len(m) - 1:
+            lines += 1
+            if lines % LINE_INDEX_STRIDE == 0:
+                index.append(pos + 1)
+            pos = m.find(b'\n', pos + 1)
+        with self._lock:
+            self._line_indexes[handle] = index
+            while len(self._line_indexes) > LINE_INDEX_CACHE_SIZE:
+                self._line_indexes.popitem(last=False)
+        return index
+
+    async def _sweep_loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logger.error(f"Failed to sweep spilled outputs in {self.directory}: {e}")
+            await asyncio.sleep(self.sweep_interval)
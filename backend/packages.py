@@ -0,0 +1,120 @@
+import logging
+import re
+
+from executor import M2_COMMAND, run_m2
+from workspaces import acquire_workspace, release_workspace
+
+logger = logging.getLogger(__name__)
+
+# Starts without the default package set; snippets get only the packages they use
+LEAN_COMMAND = [*M2_COMMAND, '--no-preload']
+
+INDEX_CODE = (
+    'scan(Core#"preloaded packages", p -> (P := needsPackage p; '
+    'scan(keys P.Dictionary, s -> print("@@symbol " | p | " " | s))));'
+)
+SYMBOL_LINE = re.compile(r'^@@symbol (\S+) (\S+)$', re.MULTILINE)
+
+TOKEN = re.compile(r"[A-Za-z][A-Za-z0-9']*")
+# Strings and comments cannot use a package symbol
+NOT_CODE = re.compile(r'"(?:[^"\\]|\\.)*"|--[^\n]*|-\*.*?\*-', re.DOTALL)
+
+
+class PackageIndex:
+    """
+    Which preloaded package exports which symbol, read once from the installed M2.
+    `preamble(code)` is the `needsPackage` line a lean (`--no-preload`) M2 needs before
+    running code; it also resets the prompt counter so the user's code is still `i1`.
+    """
+
+    def __init__(self):
+        self.symbols: dict[str, str] = {}
+        self.ready = False
+
+    async def build(self, timeout: float = 120) -> bool:
+        workdir = acquire_workspace()
+        try:
+            result = await run_m2(INDEX_CODE, workdir, timeout, LEAN_COMMAND)
+        except OSError as e:
+            logger.warning(f"Could not build the package index, keeping the full preload: {e}")
+            return False
+        finally:
+            release_workspace(workdir)
+        symbols = {symbol: package for package, symbol in SYMBOL_LINE.findall(result.stdout)}
+        if result.returncode != 0 or not symbols:
+            logger.warning(f"Could not build the package index (exit code {result.returncode}), keeping the full preload")
+            return False
+        self.symbols = symbols
+        self.ready = True
+        logger.info(f"Indexed {len(symbols)} symbols from {len(set(symbols.values()))} preloaded packages")
+        return True
+
+    def required(self, code: str) -> list[str]:
+        tokens = set(TOKEN.findall(NOT_CODE.sub(' ', code)))
+        return sorted({self.symbols[token] for token in tokens if token in self.symbols})
+
+    def preamble(self, code: str) -> str:
+        packages = self.required(code)
+        if not packages:
+            return ""
+        return "".join(f'needsPackage "{package}"; ' for package in packages) + "lineNumber = 0;"
+
+    @staticmethod
+    def strip_preamble(stdout: str, preamble: str) -> str:
+        """Drop the `i1 :` block of the injected preamble from the start of a transcript"""
+        match = re.match(rf'i1 : (?:{re.escape(preamble)})?\n+', stdout)
+        return stdout[match.end():] if match else stdout
+
+
+class PreambleStripper:
+    """
+    Wraps a capture (an `output_store.SpooledOutput`) and drops the `i1 :` block of an
+    injected preamble before it gets there, so the spilled file, its size and its line
+    numbers are those of the user's code. Only the first few bytes are held back, until
+    it is clear whether they are that block.
+    """
+
+    def __init__(self, capture, preamble: str):
+        self.capture = capture
+        encoded = preamble.encode('utf-8')
+        self._block = re.compile(rb'i1 : (?:' + re.escape(encoded) + rb')?\n+')
+        self._headers = (b'i1 : ' + encoded + b'\n', b'i1 : \n')
+        self._pending: bytes | None = b''
+        self.stripped = 0
+
+    @property
+    def handle(self) -> str | None:
+        return self.capture.handle
+
+    @property
+    def truncated(self) -> bool:
+        return self.capture.truncated
+
+    def write(self, chunk: bytes):
+        if self._pending is None:
+            self.capture.write(chunk)
+            return
+        self._pending += chunk
+        match = self._block.match(self._pending)
+        if match and match.end() < len(self._pending):
+            self._release(match.end())
+        elif not match and not any(header.startswith(self._pending) for header in self._headers):
+            self._release(0)
+
+    def close(self):
+        if self._pending is not None:
+            match = self._block.match(self._pending)
+            self._release(match.end() if match else 0)
+        self.capture.close()
+
+    def discard(self):
+        self.capture.discard()
+
+    def head(self) -> str:
+        return self.capture.head()
+
+    def _release(self, stripped: int):
+        data, self._pending = self._pending[stripped:], None
+        self.stripped = stripped
+        if data:
+            self.capture.write(data)
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+from executor import (M2_COMMAND, WALL_TIMEOUT_SECONDS, ExecutionResult, kill_process_group, release_sandbox,
+                      run_in_process, spawn_m2)
+from workspaces import acquire_workspace, release_workspace
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmSlot:
+    process: asyncio.subprocess.Process
+    workdir: str
+    started_at: float = field(default_factory=time.monotonic)
+    acquire_seconds: float = 0.0
+
+    def is_healthy(self, max_idle_seconds: float) -> bool:
+        return self.process.returncode is None and time.monotonic() - self.started_at < max_idle_seconds
+
+
+class M2Pool:
+    """
+    Keeps M2 interpreters started and idle on stdin so package loading happens off the request path.
+    Every slot is used for exactly one request and then thrown away; the refill loop replaces it.
+    """
+
+    def __init__(self, min_size: int, max_size: int, refill_per_second: float,
+                 max_idle_seconds: float, health_check_interval: float, command: list[str] = M2_COMMAND):
+        self.command = command
+        self.min_size = min_size
+        self.max_size = max_size
+        self.refill_per_second = refill_per_second
+        self.max_idle_seconds = max_idle_seconds
+        self.health_check_interval = health_check_interval
+        self._idle: deque[WarmSlot] = deque()
+        self._in_use = 0
+        self._wakeup = asyncio.Event()
+        self._refill_task: asyncio.Task | None = None
+        self.warm_hits = 0
+        self.cold_starts = 0
+        self.evicted = 0
+
+    async def start(self):
+        self._refill_task = asyncio.create_task(self._refill_loop())
+
+    async def stop(self):
+        if self._refill_task:
+            self._refill_task.cancel()
+        while self._idle:
+            await self._discard(self._idle.popleft())
+
+    @asynccontextmanager
+    async def process(self):
+        """Borrow a started M2 for a single run; it is killed and replaced afterwards"""
+        start = time.monotonic()
+        slot = await self._take_healthy()
+        if slot:
+            self.warm_hits += 1
+        else:
+            self.cold_starts += 1
+            slot = await self._spawn_slot()
+        slot.acquire_seconds = time.monotonic() - start
+        self._in_use += 1
+        self._wakeup.set()
+        try:
+            yield slot
+        finally:
+            self._in_use -= 1
+            await self._discard(slot)
+
+    async def execute(self, code: str, timeout: float = WALL_TIMEOUT_SECONDS, capture=None) -> ExecutionResult:
+        async with self.process() as slot:
+            return await run_in_process(slot.process, code, timeout, spawn_seconds=slot.acquire_seconds,
+                                        capture=capture)
+
+    def stats(self) -> dict:
+        return {
+            "idle": len(self._idle),
+            "in_use": self._in_use,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "warm_hits": self.warm_hits,
+            "cold_starts": self.cold_starts,
+            "evicted": self.evicted,
+        }
+
+    def _target_idle(self) -> int:
+        # Grow with demand, but never keep more than max_size interpreters alive
+        return max(0, min(max(self.min_size, self._in_use), self.max_size - self._in_use))
+
+    async def _take_healthy(self) -> WarmSlot | None:
+        while self._idle:
+            slot = self._idle.popleft()
+            if slot.is_healthy(self.max_idle_seconds):
+                return slot
+            self.evicted += 1
+            await self._discard(slot)
+        return None
+
+    async def _spawn_slot(self) -> WarmSlot:
+        workdir = acquire_workspace()
+        try:
+            return WarmSlot(process=await spawn_m2(workdir, self.command), workdir=workdir)
+        except BaseException:
+            release_workspace(workdir)
+            raise
+
+    async def _discard(self, slot: WarmSlot):
+        kill_process_group(slot.process)
+        await slot.process.wait()
+        await release_sandbox(slot.process)
+        release_workspace(slot.workdir)
+
+    async def _evict_unhealthy(self):
+        stale = [slot for slot in self._idle if not slot.is_healthy(self.max_idle_seconds)]
+        for slot in stale:
+            self._idle.remove(slot)
+            self.evicted += 1
+            await self._discard(slot)
+
+    async def _refill_loop(self):
+        while True:
+            await self._evict_unhealthy()
+            if len(self._idle) < self._target_idle():
+                try:
+                    self._idle.append(await self._spawn_slot())
+                except Exception as e:
+                    logger.error(f"Failed to start warm M2 process: {e}")
+                    await asyncio.sleep(self.health_check_interval)
+                    continue
+                await asyncio.sleep(1 / self.refill_per_second)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.health_check_interval)
+            except asyncio.TimeoutError:
+                pass
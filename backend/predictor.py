@@ -0,0 +1,112 @@
+import hashlib
+import math
+import re
+from collections import OrderedDict
+
+from result_cache import normalize_code
+
+# Rough cost of each expensive operation in a 4-variable ring, in seconds. Only a prior:
+# what similar code actually took replaces it as soon as there is any history.
+HEAVY_OPERATIONS = {
+    'gb': 0.5, 'groebnerBasis': 0.5, 'syz': 0.5, 'mingens': 0.3, 'trim': 0.2,
+    'res': 2.0, 'resolution': 2.0, 'betti': 1.0, 'minimalBetti': 2.0, 'Ext': 3.0, 'Tor': 3.0,
+    'hilbertSeries': 0.5, 'hilbertPolynomial': 0.5, 'saturate': 1.0, 'quotient': 0.5,
+    'decompose': 5.0, 'primaryDecomposition': 8.0, 'minimalPrimes': 3.0, 'radical': 3.0,
+    'associatedPrimes': 5.0, 'integralClosure': 8.0, 'eliminate': 1.0, 'kernel': 1.0,
+    'isPrime': 2.0, 'dim': 0.2, 'degree': 0.2, 'codim': 0.2,
+}
+OPERATION = re.compile(r'\b(' + '|'.join(sorted(HEAVY_OPERATIONS, key=len, reverse=True)) + r')\b')
+# The variables of a polynomial ring: QQ[x,y,z], ZZ/101[a..f], kk[x_1..x_8, MonomialOrder => Lex]
+RING = re.compile(r"\b(?:QQ|ZZ|RR|CC|GF\s*\([^)]*\)|ZZ\s*/\s*\d+|[A-Za-z][A-Za-z0-9']*)\s*\[([^\[\]]*)\]")
+RANGE = re.compile(r"^\s*([A-Za-z]+)_?\(?(\d*)\)?\s*\.\.\s*\1?_?\(?(\d*)\)?\s*$")
+BASE_SECONDS = 0.05
+
+
+def ring_size(code: str) -> int:
+    """Variables in the largest polynomial ring the code builds, 0 if it builds none"""
+    largest = 0
+    for ring in RING.finditer(code):
+        variables = 0
+        for item in ring.group(1).split(','):
+            if '=>' in item:
+                continue
+            span = RANGE.match(item)
+            if span and span.group(2) and span.group(3):
+                variables += abs(int(span.group(3)) - int(span.group(2))) + 1
+            elif '..' in item:
+                ends = [end.strip() for end in item.split('..')]
+                single_letters = all(len(end) == 1 and end.isalpha() for end in ends)
+                variables += abs(ord(ends[1]) - ord(ends[0])) + 1 if single_letters else 1
+            elif item.strip():
+                variables += 1
+        largest = max(largest, variables)
+    return largest
+
+
+def features(code: str) -> tuple[frozenset, int]:
+    """The expensive operations used and the ring size rounded up to a power of two"""
+    size = ring_size(code)
+    return frozenset(OPERATION.findall(code)), 1 << (size - 1).bit_length() if size else 0
+
+
+def prior_seconds(operations: frozenset, size: int) -> float:
+    # Groebner-type computations grow steeply with the number of variables
+    scale = max(1.0, size / 4) ** 3
+    return BASE_SECONDS + sum(HEAVY_OPERATIONS[operation] for operation in operations) * scale
+
+
+class RuntimePredictor:
+    """
+    Estimates how long a snippet will run before it runs. A snippet seen before gets
+    the running average of its own runtimes; otherwise the average of snippets with
+    the same expensive operations and ring size; otherwise a prior from those same
+    features. Averages are taken over log runtimes, so one outlier moves them by a
+    factor rather than by its size. History is per process and bounded by LRU.
+    """
+
+    def __init__(self, history_size: int, alpha: float = 0.3):
+        self.history_size = history_size
+        self.alpha = alpha
+        self._by_code: OrderedDict[bytes, float] = OrderedDict()
+        self._by_features: OrderedDict[tuple, float] = OrderedDict()
+        self.observations = 0
+        self.within_2x = 0
+        self._log_error_sum = 0.0
+
+    def predict(self, code: str) -> float:
+        key = self._code_key(code)
+        if key in self._by_code:
+            return math.exp(self._by_code[key])
+        signature = features(code)
+        if signature in self._by_features:
+            return math.exp(self._by_features[signature])
+        return prior_seconds(*signature)
+
+    def observe(self, code: str, predicted: float, actual: float):
+        actual = max(actual, 1e-3)
+        self._update(self._by_code, self._code_key(code), math.log(actual))
+        self._update(self._by_features, features(code), math.log(actual))
+        error = abs(math.log(actual / max(predicted, 1e-3)))
+        self.observations += 1
+        self.within_2x += error <= math.log(2)
+        self._log_error_sum += error
+
+    def stats(self) -> dict:
+        return {
+            "observations": self.observations,
+            "known_snippets": len(self._by_code),
+            "known_signatures": len(self._by_features),
+            "within_2x": self.within_2x / self.observations if self.observations else None,
+            # exp of the mean |log(actual / predicted)|: 1.0 is perfect, 2.0 is off by 2x on average
+            "mean_error_factor": math.exp(self._log_error_sum / self.observations) if self.observations else None,
+        }
+
+    def _update(self, history: OrderedDict, key, value: float):
+        previous = history.pop(key, None)
+        history[key] = value if previous is None else (1 - self.alpha) * previous + self.alpha * value
+        while len(history) > self.history_size:
+            history.popitem(last=False)
+
+    @staticmethod
+    def _code_key(code: str) -> bytes:
+        return hashlib.blake2b(normalize_code(code).encode('utf-8'), digest_size=16).digest()
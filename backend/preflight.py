@@ -0,0 +1,58 @@
+import re
+
+# Only what can break the lexer or bracket balance is looked at; everything between is skipped
+TOKEN = re.compile(r'''
+    --[^\n]*                     # line comment
+  | -\*.*?\*-                    # block comment
+  | (?P<open_comment>-\*)
+  | "(?:[^"\\]|\\.)*"            # string
+  | (?P<open_string>")
+  | ///.*?///                    # block string
+  | (?P<open_block_string>///)
+  | (?P<open>[(\[{])
+  | (?P<close>[)\]}])
+''', re.VERBOSE | re.DOTALL)
+
+CLOSING = {'(': ')', '[': ']', '{': '}'}
+
+
+def location(code: str, offset: int) -> tuple[int, int]:
+    line = code.count('\n', 0, offset) + 1
+    return line, offset - (code.rfind('\n', 0, offset) + 1) + 1
+
+
+def syntax_error(code: str, offset: int, message: str) -> str:
+    line, column = location(code, offset)
+    return f"stdio:{line}:{column}:(3): error: {message}"
+
+
+def check_syntax(code: str) -> str | None:
+    """
+    The first lexical or bracket error in `code` as M2 would print it (stdio:line:column),
+    or None. Unterminated strings and comments, and unmatched or mismatched (), [] and {}
+    are caught; anything M2 could only tell by parsing further is left to M2.
+    """
+    openers: list[tuple[str, int]] = []
+    for token in TOKEN.finditer(code):
+        kind = token.lastgroup
+        if kind is None:
+            continue
+        if kind == 'open':
+            openers.append((token.group(), token.start()))
+        elif kind == 'close':
+            if not openers:
+                return syntax_error(code, token.start(), f"syntax error at '{token.group()}'")
+            opener, offset = openers.pop()
+            if CLOSING[opener] != token.group():
+                line, column = location(code, offset)
+                return syntax_error(code, token.start(),
+                                    f"syntax error at '{token.group()}', expected '{CLOSING[opener]}' "
+                                    f"to match '{opener}' at {line}:{column}")
+        elif kind == 'open_comment':
+            return syntax_error(code, token.start(), "unterminated comment")
+        else:
+            return syntax_error(code, token.start(), "unterminated string")
+    if openers:
+        opener, offset = openers[-1]
+        return syntax_error(code, offset, f"unmatched '{opener}'")
+    return None
@@ -0,0 +1,146 @@
+import re
+
+from packages import NOT_CODE
+from predictor import HEAVY_OPERATIONS
+from preflight import TOKEN
+
+# Runs after every top-level statement. It prints the CPU time used so far, before and
+# after its own garbage collection, and puts lineNumber back, so the user's cells keep
+# their numbers. Garbage is only collected after cells that used more than 0.1s of CPU,
+# which keeps the overhead to a few percent while memory growth still reflects live data
+# for the cells that matter.
+PROBE = ("profile't = cpuTime(); if profile't - profile'cpu > 0.1 then collectGarbage(); profile'cpu = cpuTime(); "
+         "<< \"@@profile \" << toString profile't << \" \" << toString profile'cpu << endl << flush; "
+         "lineNumber = lineNumber - 1;")
+INIT = ("profile'cpu = cpuTime(); "
+        "<< \"@@profile \" << toString profile'cpu << \" \" << toString profile'cpu << endl << flush; lineNumber = 0;")
+MARKER = re.compile(r'^@@profile (\S+) (\S+)$')
+PROBE_BLOCK = re.compile(rf'i\d+ : (?:{re.escape(PROBE)}|{re.escape(INIT)}|[^\n]*{re.escape(INIT)})\n'
+                         r'(?:@@profile \S+ \S+\n)?\n*')
+
+LINE_END = re.compile(r'\n')
+# A line ending in an operator or one of these keywords continues on the next line
+CONTINUES = re.compile(r'(?:[-+*/^=<>|&,.:@\\#%_]|\b(?:then|else|do|list|of|from|to|in|when|and|or|xor|not|new|'
+                       r'return|try|catch|if|while|for|local|global|symbol|time|timing|elapsedTime|elapsedTiming))$')
+ASSIGNMENT = re.compile(r"^\s*[A-Za-z][A-Za-z0-9']*\s*(?::=|=)(?!=)\s*")
+FUNCTION = re.compile(r"^\(?[A-Za-z0-9', ]*\)?\s*->")
+IDENTIFIER = re.compile(r"[A-Za-z][A-Za-z0-9']*")
+# Core names a cell can be keyed on. Any other name is the user's own and goes to USER_CODE,
+# so the stats table stays small and never shows what users called things
+CORE_NAMES = frozenset(HEAVY_OPERATIONS) | {
+    'QQ', 'ZZ', 'RR', 'CC', 'GF', 'ideal', 'matrix', 'map', 'vars', 'ker', 'image', 'coker', 'cokernel',
+    'det', 'rank', 'transpose', 'inverse', 'factor', 'gcd', 'lcm', 'random', 'basis', 'sub', 'substitute',
+    'apply', 'scan', 'select', 'toList', 'sum', 'product', 'print', 'net', 'toString', 'degrees', 'genus',
+    'module', 'prune', 'minimalPresentation', 'homology', 'HH', 'Hom', 'tensor', 'exteriorPower',
+    'symmetricPower', 'frac', 'newRing', 'monomialIdeal', 'leadTerm', 'gens', 'generators', 'numgens',
+    'length', 'entries', 'flatten', 'coefficients', 'monomials', 'terms', 'sort', 'unique', 'tally',
+    'for', 'while', 'if', 'try', 'time', 'timing', 'elapsedTime', 'return', 'new', 'local', 'global',
+    'needsPackage', 'loadPackage',
+}
+USER_CODE = "(user code)"
+
+
+def split_statements(code: str) -> list[str]:
+    """
+    Top-level statements of `code`, each the text M2 reads as one input: a line break
+    ends a statement unless it is inside brackets, a string or a comment, or the line
+    ends in an operator or a keyword that needs more. Lines with nothing but comments
+    or blanks stay with the statement that follows them.
+    """
+    statements = []
+    depth = 0
+    start = 0
+    offset = 0
+    tokens = [(token.start(), token.end(), token.lastgroup) for token in TOKEN.finditer(code)]
+    breaks = [(m.start(), m.end(), 'newline') for m in LINE_END.finditer(code)]
+    for position, end, kind in sorted(tokens + breaks):
+        if position < offset:
+            # Line breaks inside a string or block comment
+            continue
+        offset = end
+        if kind == 'open':
+            depth += 1
+        elif kind == 'close':
+            depth = max(0, depth - 1)
+        elif kind == 'newline' and depth == 0:
+            text = code[start:position]
+            if significant(text) and not CONTINUES.search(significant(text).splitlines()[-1].rstrip()):
+                statements.append(text)
+                start = end
+    if significant(code[start:]):
+        statements.append(code[start:])
+    elif statements:
+        statements[-1] += code[start:]
+    return statements
+
+
+def significant(text: str) -> str:
+    """The text with comments removed and trailing blanks stripped"""
+    return TOKEN.sub(lambda token: token.group() if not token.group().startswith('-') else '', text).rstrip()
+
+
+def instrument(statements: list[str], preamble: str = "") -> str:
+    """The program to run: the hidden INIT (after any package preamble), then each statement followed by PROBE"""
+    init = preamble.removesuffix("lineNumber = 0;") + INIT
+    return "\n".join([init] + [f"{statement}\n{PROBE}" for statement in statements])
+
+
+def strip_probes(stdout: str) -> str:
+    return PROBE_BLOCK.sub('', stdout)
+
+
+def construct_of(statement: str, package_symbols=()) -> str:
+    """
+    What a cell mostly does, for aggregate stats: the first name after any `x = `, when it is
+    a Core name or one of `package_symbols`, and USER_CODE otherwise
+    """
+    expression = ASSIGNMENT.sub('', NOT_CODE.sub(' ', statement).strip(), count=1)
+    if FUNCTION.match(expression):
+        return "(function definition)"
+    match = IDENTIFIER.search(expression)
+    if not match:
+        return "(other)"
+    name = match.group()
+    return name if name in CORE_NAMES or name in package_symbols else USER_CODE
+
+
+class ProbeReader:
+    """
+    Picks the probe markers out of stdout as it arrives, noting when each one came and
+    the RSS of the process right then, and turns them into one profile per cell.
+    """
+
+    def __init__(self, package_symbols=()):
+        self.package_symbols = package_symbols
+        # (arrival, CPU seconds at the end of the cell, CPU seconds after the probe, RSS)
+        self.markers: list[tuple[float, float, float, int]] = []
+        self._pending = ""
+
+    def feed(self, text: str, now: float, read_rss):
+        """`read_rss()` gives the process RSS in bytes; it is only called when a marker arrives"""
+        lines = (self._pending + text).split('\n')
+        self._pending = lines.pop()
+        for line in lines:
+            match = MARKER.match(line)
+            if match:
+                self.markers.append((now, float(match.group(1)), float(match.group(2)), read_rss()))
+
+    def cells(self, statements: list[str], end: float) -> list[dict]:
+        """Cells that finished, plus the one M2 was in when it stopped (complete=False)"""
+        if not self.markers:
+            return []
+        cells = []
+        (previous_time, _, previous_cpu, previous_rss), finished = self.markers[0], self.markers[1:]
+        for n, statement in enumerate(statements, start=1):
+            cell = {"n": n, "input": statement.strip()[:200], "kind": construct_of(statement, self.package_symbols)}
+            if n <= len(finished):
+                now, cpu, cpu_after_probe, rss = finished[n - 1]
+                cells.append({**cell, "wall_seconds": now - previous_time, "cpu_seconds": max(0.0, cpu - previous_cpu),
+                              "memory_growth_bytes": rss - previous_rss, "complete": True})
+                # The next cell starts after the probe's own garbage collection
+                previous_time, previous_cpu, previous_rss = now, cpu_after_probe, rss
+            else:
+                cells.append({**cell, "wall_seconds": max(0.0, end - previous_time), "cpu_seconds": None,
+                              "memory_growth_bytes": None, "complete": False})
+                break
+        return cells
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Replays a trace recorded with M2_TRACE_FILE against the API and reports throughput, tail latency and error rate.
+Requests go out at their recorded arrival times divided by --speedup, whether or not earlier ones have
+finished. With --serve the backend is started here and every recorded client gets its own loopback
+address, so per-client queue limits apply as they did in production; add --fake to run it on a
+stand-in M2 that answers each request with its recorded M2 wall time, output size and outcome.
+
+    python replay.py traces.jsonl --serve --fake --speedup 4
+    python replay.py traces.jsonl --url http://staging:8000 --json report.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+from fake_m2 import fake_m2_on_path
+from scheduler import percentiles
+from traces import load_traces
+
+MARKER = re.compile(r'^-- replay (\S+) ([\d.]+) (\d+) (\S+)$', re.MULTILINE)
+
+# Sleeps and prints what the marker in the replayed code asks for; anything else is the health probe
+FAKE_REPLAY_M2_SCRIPT = f"""#!{sys.executable}
+import re, sys, time
+if sys.argv[1:] == ["--version"]:
+    print("1.0-fake")
+    sys.exit(0)
+code = sys.stdin.read()
+marker = re.search({MARKER.pattern!r}, code, re.MULTILINE)
+if not marker:
+    print("i1 : 2+2\\n\\no1 = 4\\n")
+    sys.exit(0)
+_, wall, output_bytes, outcome = marker.groups()
+time.sleep(float(wall))
+line = "x" * 79 + "\\n"
+output = "i1 : 2+2\\n\\no1 = " + line * (int(output_bytes) // len(line))
+sys.stdout.write(output)
+if outcome in ("error", "memory_limit", "cpu_limit", "file_size_limit", "killed"):
+    sys.stderr.write("stdio:1:1:(3): error: replayed " + outcome + "\\n")
+    sys.exit(1)
+"""
+
+
+def replay_code(trace: dict, reference: dict) -> str:
+    """Stand-in code of the recorded size; equal hashes give equal code, so the result cache still hits"""
+    marker = (f"-- replay {trace['code_hash']} {reference['wall_seconds']:.3f} {reference['output_bytes']} "
+              f"{reference['outcome']}\n")
+    padding = max(0, trace['code_bytes'] - len(marker) - len("2+2") - 4)
+    return marker + "-- " + "x" * padding + "\n2+2"
+
+
+def references(traces: list[dict]) -> dict:
+    """Per code hash, the first trace that actually ran M2, for the fake to imitate"""
+    by_hash = {}
+    for trace in traces:
+        if trace['code_hash'] not in by_hash or by_hash[trace['code_hash']]['outcome'] in ("cached", "rejected"):
+            by_hash[trace['code_hash']] = trace
+    return by_hash
+
+
+async def send(client: httpx.AsyncClient, url: str, code: str) -> dict:
+    start = time.perf_counter()
+    try:
+        response = await client.post(f"{url}/execute", json={"code": code})
+        status = response.status_code
+        success = status == 200 and response.json().get("success", False)
+    except httpx.HTTPError as e:
+        status, success = type(e).__name__, False
+    return {"status": status, "success": success, "latency": time.perf_counter() - start}
+
+
+def loopback_address(index: int) -> str:
+    n = index + 2
+    return f"127.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}"
+
+
+async def replay(traces: list[dict], url: str, speedup: float, per_client: bool) -> tuple[list[dict], float]:
+    by_hash = references(traces)
+    first = traces[0]['arrival']
+    loop = asyncio.get_running_loop()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+    clients = {}
+    for trace in traces:
+        key = trace.get('client', '') if per_client else ''
+        if key not in clients:
+            transport = httpx.AsyncHTTPTransport(local_address=loopback_address(len(clients)) if per_client else None,
+                                                 limits=limits)
+            clients[key] = httpx.AsyncClient(timeout=300, transport=transport)
+    try:
+        start = loop.time()
+        tasks = []
+        for trace in traces:
+            delay = (trace['arrival'] - first) / speedup - (loop.time() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            client = clients[trace.get('client', '') if per_client else '']
+            code = replay_code(trace, by_hash[trace['code_hash']])
+            tasks.append(asyncio.create_task(send(client, url, code)))
+        results = await asyncio.gather(*tasks)
+        return results, loop.time() - start
+    finally:
+        for client in clients.values():
+            await client.aclose()
+
+
+def report(traces: list[dict], results: list[dict], elapsed: float, speedup: float) -> dict:
+    ok = [r for r in results if r['status'] == 200]
+    recorded_span = (traces[-1]['arrival'] - traces[0]['arrival']) or 1e-9
+    return {
+        "requests": len(results),
+        "clients": len({t.get('client') for t in traces}),
+        "speedup": speedup,
+        "elapsed_seconds": elapsed,
+        "offered_rps": len(traces) / recorded_span * speedup,
+        "throughput_rps": len(ok) / elapsed if elapsed else None,
+        "latency_seconds": percentiles([r['latency'] for r in ok]),
+        "recorded_latency_seconds": percentiles([t['latency_seconds'] for t in traces]),
+        "http_error_rate": 1 - len(ok) / len(results),
+        "m2_failure_rate": sum(not r['success'] for r in ok) / len(ok) if ok else None,
+        "status_counts": dict(Counter(str(r['status']) for r in results)),
+        "recorded_outcomes": dict(Counter(t['outcome'] for t in traces)),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(workers: int, state_dir: str) -> tuple[subprocess.Popen, str]:
+    """Start the backend on a free port with its own state files, so the replay leaves no trace behind"""
+    port = free_port()
+    env = {
+        **os.environ,
+        "M2_TRACE_FILE": "",
+        "M2_STATS_DB_FILE": os.path.join(state_dir, "stats.db"),
+        "M2_JOBS_DB_FILE": os.path.join(state_dir, "jobs.db"),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return server, url
+        except httpx.HTTPError:
+            pass
+        if server.poll() is not None:
+            raise SystemExit("The backend exited during startup")
+        time.sleep(0.2)
+    server.terminate()
+    raise SystemExit("The backend did not come up within 60 seconds")
+
+
+def run(args, traces: list[dict]) -> dict:
+    if not args.serve:
+        results, elapsed = asyncio.run(replay(traces, args.url, args.speedup, per_client=False))
+        return report(traces, results, elapsed, args.speedup)
+    with tempfile.TemporaryDirectory() as state_dir:
+        server, url = serve(args.workers, state_dir)
+        try:
+            results, elapsed = asyncio.run(replay(traces, url, args.speedup, per_client=True))
+        finally:
+            server.terminate()
+            server.wait()
+    return report(traces, results, elapsed, args.speedup)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('trace', help='JSON lines written by the backend with M2_TRACE_FILE and M2_TRACE_HASH_KEY set')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='Backend to replay against')
+    parser.add_argument('--speedup', type=float, default=1.0, help='Divide recorded inter-arrival times by this')
+    parser.add_argument('--limit', type=int, default=None, help='Replay only the first N requests')
+    parser.add_argument('--serve', action='store_true', help='Start the backend here instead of using --url')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn workers with --serve')
+    parser.add_argument('--fake', action='store_true', help='With --serve, run on a fake M2 imitating the trace')
+    parser.add_argument('--json', help='Also write the report to this file')
+    args = parser.parse_args()
+
+    traces = load_traces(args.trace)[:args.limit]
+    if not traces:
+        raise SystemExit("The trace is empty")
+    if args.fake:
+        if not args.serve:
+            raise SystemExit("--fake needs --serve, the fake M2 has to be on the backend's PATH")
+        with fake_m2_on_path(FAKE_REPLAY_M2_SCRIPT):
+            result = run(args, traces)
+    else:
+        result = run(args, traces)
+
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
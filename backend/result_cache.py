@@ -0,0 +1,125 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Output of these depends on randomness, the clock or the filesystem, so it must not be replayed
+NONDETERMINISTIC = re.compile(
+    r'\b(random\w*|currentTime|cpuTime|time|elapsedTime|timing|elapsedTiming|'
+    r'get|run|openIn|openOut|openInOut|fileExists|readDirectory)\b'
+)
+
+
+def normalize_code(code: str) -> str:
+    return '\n'.join(line.rstrip() for line in code.replace('\r\n', '\n').split('\n')).strip('\n')
+
+
+def is_cacheable(code: str) -> bool:
+    return NONDETERMINISTIC.search(code) is None
+
+
+class ResultCache:
+    """
+    Content-addressed cache of /execute responses keyed on normalized code and the M2 version.
+    A byte-bounded LRU in memory, optionally backed by one JSON file per entry on disk.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, directory: str = "", disk_max_entries: int = 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = Path(directory) if directory else None
+        self.disk_max_entries = disk_max_entries
+        self.m2_version: str | None = None
+        self._entries: OrderedDict[str, tuple[dict, int]] = OrderedDict()
+        self._bytes = 0
+        self._disk_writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def key_for(self, code: str) -> str | None:
+        if self.m2_version is None or not is_cacheable(code):
+            return None
+        digest = hashlib.sha256()
+        digest.update(self.m2_version.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(normalize_code(code).encode('utf-8'))
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> dict | None:
+        entry = self._entries.get(key)
+        if entry:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if self.directory:
+            value = await asyncio.to_thread(self._read_disk, key)
+            if value is not None:
+                self.disk_hits += 1
+                self._remember(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, value: dict):
+        self._remember(key, value)
+        if self.directory:
+            await asyncio.to_thread(self._write_disk, key, value)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "m2_version": self.m2_version,
+        }
+
+    def _remember(self, key: str, value: dict):
+        size = sum(len(v) for v in value.values() if isinstance(v, str))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _read_disk(self, key: str) -> dict | None:
+        try:
+            return json.loads(self._path(key).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key: str, value: dict):
+        path = self._path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(value), encoding='utf-8')
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.error(f"Failed to write cache entry {key}: {e}")
+            return
+        self._disk_writes += 1
+        if self._disk_writes % 1000 == 0:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        files = sorted(self.directory.glob('*/*.json'), key=lambda p: p.stat().st_mtime)
+        for path in files[:max(0, len(files) - self.disk_max_entries)]:
+            path.unlink(missing_ok=True)
@@ -0,0 +1,234 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+import metrics
+from predictor import RuntimePredictor
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def default_max_concurrency(memory_per_job: int) -> int:
+    """One job per core, but never more jobs than their memory limits fit into physical RAM"""
+    cpus = os.cpu_count() or 1
+    try:
+        ram = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return cpus
+    return max(1, min(cpus, ram // memory_per_job))
+
+
+def percentiles(values, points=(50, 95, 99)) -> dict:
+    ordered = sorted(values)
+    if not ordered:
+        return {f"p{p}": None for p in points}
+    return {f"p{p}": ordered[min(len(ordered) - 1, len(ordered) * p // 100)] for p in points}
+
+
+FAST = "fast"
+SLOW = "slow"
+THROTTLED = "throttled"
+LANES = (FAST, SLOW, THROTTLED)
+
+
+@dataclass
+class Ticket:
+    lane: str
+    predicted_seconds: float | None = None
+
+
+class FairScheduler:
+    """
+    Caps concurrent executions and queues the rest in a bounded FIFO per client.
+    Freed slots are handed to waiting clients round-robin, so one IP flooding
+    the queue cannot starve the others.
+
+    With a predictor, jobs predicted to take at most `fast_lane_seconds` go to the fast
+    lane: its waiters are served first and `fast_lane_slots` slots are never given to
+    slow jobs, so a `2+2` does not wait behind a row of resolutions. A fast job still
+    running after twice its prediction (and at least `fast_lane_seconds`) is demoted
+    to the slow lane. Throttled jobs, from clients over their CPU budget, share the
+    slow lane's slots but are only served when no one else is waiting. A waiter that
+    has waited half of `max_wait_seconds` goes first whatever its lane, so a steady
+    stream of short jobs cannot starve the others. Background waiters (queued jobs) are
+    never rejected and wait as long as it takes, without that head start.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, max_queue_per_client: int,
+                 max_wait_seconds: float, history_size: int = 1000, predictor: RuntimePredictor | None = None,
+                 fast_lane_slots: int = 0, fast_lane_seconds: float = 1.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue_per_client
+        self.max_wait_seconds = max_wait_seconds
+        self.predictor = predictor
+        # Slow jobs always keep at least one slot
+        self.fast_lane_slots = max(0, min(fast_lane_slots, max_concurrency - 1)) if predictor else 0
+        self.fast_lane_seconds = fast_lane_seconds
+        self._running = 0
+        self._running_slow = 0
+        self._queued = 0
+        # Of those queued, how many are background waiters; they do not count against max_queue
+        self._queued_background = 0
+        self._queues: dict[str, OrderedDict[str, deque[tuple[asyncio.Future, float]]]] = {
+            lane: OrderedDict() for lane in LANES}
+        self._waits = deque(maxlen=history_size)
+        self._service_seconds = 1.0
+        self.rejected_full = 0
+        self.rejected_client = 0
+        self.rejected_timeout = 0
+        self.demoted = 0
+
+    @asynccontextmanager
+    async def slot(self, client: str, code: str = "", throttled: bool = False, background: bool = False):
+        predicted = self.predictor.predict(code) if self.predictor and code else None
+        if throttled:
+            ticket = Ticket(THROTTLED, predicted)
+        else:
+            ticket = Ticket(FAST if predicted is not None and predicted <= self.fast_lane_seconds else SLOW, predicted)
+        await self.acquire(client, ticket.lane, background)
+        start = time.monotonic()
+        demotion = None
+        if ticket.lane == FAST:
+            demotion = asyncio.get_running_loop().call_later(max(2 * predicted, self.fast_lane_seconds),
+                                                             self._demote, ticket)
+        try:
+            yield ticket
+        finally:
+            elapsed = time.monotonic() - start
+            if demotion:
+                demotion.cancel()
+            self._service_seconds = 0.9 * self._service_seconds + 0.1 * elapsed
+            self.release(ticket.lane)
+            if predicted is not None:
+                self.predictor.observe(code, predicted, elapsed)
+                metrics.predicted_seconds.observe(predicted, lane=ticket.lane)
+                metrics.prediction_ratio.observe(elapsed / max(predicted, 1e-3), lane=ticket.lane)
+
+    async def acquire(self, client: str, lane: str = SLOW, background: bool = False):
+        start = time.monotonic()
+        if self._can_start(lane) and not self._queues[lane]:
+            self._start(lane)
+            self._waits.append(0.0)
+            return
+
+        if not background and self._queued - self._queued_background >= self.max_queue:
+            self.rejected_full += 1
+            raise AdmissionRejected(503, "Server busy: execution queue is full", self.retry_after())
+        if not background and (sum(len(queues.get(client, ())) for queues in self._queues.values())
+                               >= self.max_queue_per_client):
+            self.rejected_client += 1
+            raise AdmissionRejected(429, "Too many queued executions from this client", self.retry_after())
+
+        granted = asyncio.get_running_loop().create_future()
+        self._queues[lane].setdefault(client, deque()).append((granted, math.inf if background else start))
+        self._queued += 1
+        self._queued_background += background
+        try:
+            await asyncio.wait_for(granted, None if background else self.max_wait_seconds)
+        except asyncio.TimeoutError:
+            if granted.done() and not granted.cancelled():
+                self.release(lane)
+            else:
+                self._withdraw(client, granted, lane)
+            self.rejected_timeout += 1
+            raise AdmissionRejected(503, "Server busy: timed out waiting for an execution slot", self.retry_after())
+        except asyncio.CancelledError:
+            if granted.done() and not granted.cancelled():
+                self.release(lane)
+            else:
+                self._withdraw(client, granted, lane)
+            raise
+        self._waits.append(time.monotonic() - start)
+
+    def release(self, lane: str = SLOW):
+        self._running -= 1
+        if lane != FAST:
+            self._running_slow -= 1
+        while (lane := self._next_lane()) is not None:
+            queues = self._queues[lane]
+            client, queue = next(iter(queues.items()))
+            granted, enqueued = queue.popleft()
+            self._queued -= 1
+            self._queued_background -= enqueued == math.inf
+            if queue:
+                queues.move_to_end(client)
+            else:
+                del queues[client]
+            if not granted.done():
+                self._start(lane)
+                granted.set_result(None)
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil((self._queued + 1) / self.max_concurrency * self._service_seconds))
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running,
+            "running_slow": self._running_slow,
+            "queued": self._queued,
+            "queued_fast": sum(len(queue) for queue in self._queues[FAST].values()),
+            "queued_throttled": sum(len(queue) for queue in self._queues[THROTTLED].values()),
+            "queued_background": self._queued_background,
+            "clients_waiting": len(set().union(*self._queues.values())),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "fast_lane_slots": self.fast_lane_slots,
+            "demoted": self.demoted,
+            "wait_seconds": percentiles(self._waits),
+            "rejected": {
+                "queue_full": self.rejected_full,
+                "client_limit": self.rejected_client,
+                "wait_timeout": self.rejected_timeout,
+            },
+            "prediction": self.predictor.stats() if self.predictor else None,
+        }
+
+    def _can_start(self, lane: str) -> bool:
+        if self._running >= self.max_concurrency:
+            return False
+        return lane == FAST or self._running_slow < self.max_concurrency - self.fast_lane_slots
+
+    def _start(self, lane: str):
+        self._running += 1
+        if lane != FAST:
+            self._running_slow += 1
+
+    def _next_lane(self) -> str | None:
+        ready = [lane for lane in LANES if self._queues[lane] and self._can_start(lane)]
+        now = time.monotonic()
+        for lane in ready:
+            _, enqueued = next(iter(self._queues[lane].values()))[0]
+            if now - enqueued > self.max_wait_seconds / 2:
+                return lane
+        return ready[0] if ready else None
+
+    def _demote(self, ticket: Ticket):
+        ticket.lane = SLOW
+        self._running_slow += 1
+        self.demoted += 1
+        metrics.demotions.inc()
+
+    def _withdraw(self, client: str, granted: asyncio.Future, lane: str):
+        queues = self._queues[lane]
+        queue = queues.get(client)
+        if queue is None:
+            return
+        for entry in queue:
+            if entry[0] is granted:
+                queue.remove(entry)
+                self._queued -= 1
+                self._queued_background -= entry[1] == math.inf
+                break
+        if not queue:
+            del queues[client]
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import re
+import secrets
+import time
+from collections import OrderedDict
+
+from executor import (READ_CHUNK_SIZE, WALL_TIMEOUT_SECONDS, kill_process_group, read_cpu_seconds, release_sandbox,
+                      spawn_m2)
+from workspaces import acquire_workspace, release_workspace
+
+logger = logging.getLogger(__name__)
+
+# No --stop: an error in one cell must not end the session
+SESSION_COMMAND = ['M2', '--silent', '--no-readline']
+ERROR_LINE = re.compile(r'^stdio:\d+:\d+:\(\d+\):.*error:.*$', re.MULTILINE)
+PROMPT = re.compile(rb'(?:^|\n)i\d+ : ')
+
+
+class SessionNotFound(Exception):
+    pass
+
+
+class SessionEnded(Exception):
+    pass
+
+
+class SessionLimitReached(Exception):
+    pass
+
+
+class Session:
+    """
+    One long-lived M2 interpreter. Cells are written to its stdin followed by a
+    `print` of a random marker; everything M2 writes up to the marker is the cell's
+    transcript. stderr is merged into stdout so errors stay in order.
+    """
+
+    def __init__(self, session_id: str, workdir: str, process: asyncio.subprocess.Process):
+        self.id = session_id
+        self.workdir = workdir
+        self.process = process
+        self.marker = f"__m2_cell_done_{secrets.token_hex(8)}__"
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        self.cells = 0
+        # CPU seconds of the interpreter so far, and of the last cell
+        self.cpu_seconds = 0.0
+        self.cell_cpu_seconds = 0.0
+        self._pending = b""
+
+    @classmethod
+    async def start(cls, session_id: str) -> "Session":
+        workdir = acquire_workspace()
+        try:
+            process = await spawn_m2(workdir, SESSION_COMMAND, merge_stderr=True)
+        except BaseException:
+            release_workspace(workdir)
+            raise
+        session = cls(session_id, workdir, process)
+        try:
+            # Swallow the banner and the marker's own echo so the first cell starts clean
+            await session._run("", WALL_TIMEOUT_SECONDS)
+        except BaseException:
+            await session.close()
+            raise
+        # Startup is not billed to the first cell
+        session.cpu_seconds = read_cpu_seconds(process.pid)
+        return session
+
+    async def execute(self, code: str, timeout: float = WALL_TIMEOUT_SECONDS) -> str:
+        async with self.lock:
+            self.last_used = time.monotonic()
+            output = await self._run(code, timeout)
+            self.cells += 1
+            cpu_seconds = read_cpu_seconds(self.process.pid)
+            self.cell_cpu_seconds, self.cpu_seconds = cpu_seconds - self.cpu_seconds, cpu_seconds
+            self.last_used = time.monotonic()
+            return output
+
+    async def close(self):
+        kill_process_group(self.process)
+        await self.process.wait()
+        await release_sandbox(self.process)
+        release_workspace(self.workdir)
+
+    async def _run(self, code: str, timeout: float) -> str:
+        if self.process.returncode is not None:
+            raise SessionEnded("Session process has exited")
+        cell = (code + "\n" if code else "") + f'print "{self.marker}";\n'
+        # Write while reading, a big cell with big output would otherwise fill both pipes
+        feeder = asyncio.create_task(self._write(cell.encode('utf-8')))
+        try:
+            return await asyncio.wait_for(self._read_until_marker(), timeout)
+        except asyncio.TimeoutError:
+            kill_process_group(self.process)
+            raise
+        finally:
+            feeder.cancel()
+
+    async def _write(self, data: bytes):
+        try:
+            self.process.stdin.write(data)
+            await self.process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # The reader sees EOF and reports the session as ended
+            pass
+
+    async def _read_until_marker(self) -> str:
+        marker_line = b"\n" + self.marker.encode('ascii') + b"\n"
+        buffer = b"\n" + self._pending
+        searched = 0
+        while (end := buffer.find(marker_line, searched)) < 0:
+            searched = max(0, len(buffer) - len(marker_line))
+            chunk = await self.process.stdout.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise SessionEnded(buffer[1:].decode('utf-8', errors='replace'))
+            buffer += chunk
+        self._pending = buffer[end + len(marker_line):]
+        transcript = buffer[1:end + 1]
+        # Drop the echoed `print "marker";` input together with its prompt
+        prompts = list(PROMPT.finditer(transcript))
+        if prompts:
+            transcript = transcript[:prompts[-1].start()]
+        return transcript.decode('utf-8', errors='replace').strip('\n') + "\n"
+
+
+class SessionManager:
+    """
+    Owns all live sessions: creates them under a global cap (evicting the least
+    recently used one when full) and closes sessions idle for longer than the TTL.
+    Sessions live in this process, so a session id is only known to the worker that
+    created it: run a single worker, or route each session to one worker.
+    """
+
+    def __init__(self, max_sessions: int, idle_ttl_seconds: float, sweep_interval: float):
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.sweep_interval = sweep_interval
+        self._sessions: OrderedDict[str, Session] = OrderedDict()
+        self._starting = 0
+        self._sweep_task: asyncio.Task | None = None
+        self.evicted_lru = 0
+        self.evicted_idle = 0
+
+    async def start(self):
+        self._sweep_task = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self):
+        if self._sweep_task:
+            self._sweep_task.cancel()
+        while self._sessions:
+            await self._sessions.popitem()[1].close()
+
+    async def create(self) -> Session:
+        # The slot is reserved before the first await, so concurrent creates cannot all pass the cap
+        self._starting += 1
+        try:
+            while len(self._sessions) + self._starting > self.max_sessions:
+                if not self._sessions:
+                    # Every slot is taken by a session that is still starting
+                    raise SessionLimitReached()
+                _, oldest = self._sessions.popitem(last=False)
+                self.evicted_lru += 1
+                await oldest.close()
+            session = await Session.start(secrets.token_urlsafe(16))
+        finally:
+            self._starting -= 1
+        self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Session:
+        session = self._sessions.get(session_id)
+        if session is None:
+            raise SessionNotFound(session_id)
+        self._sessions.move_to_end(session_id)
+        return session
+
+    async def execute(self, session_id: str, code: str) -> tuple[Session, str]:
+        session = self.get(session_id)
+        try:
+            return session, await session.execute(code)
+        except (SessionEnded, asyncio.TimeoutError):
+            # A reset may already have replaced this session under the same id
+            if self._sessions.get(session_id) is session:
+                del self._sessions[session_id]
+            await session.close()
+            raise
+
+    async def reset(self, session_id: str) -> Session:
+        old = self.get(session_id)
+        await old.close()
+        session = await Session.start(session_id)
+        self._sessions[session_id] = session
+        return session
+
+    async def close(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            raise SessionNotFound(session_id)
+        await session.close()
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._sessions),
+            "starting": self._starting,
+            "max_sessions": self.max_sessions,
+            "evicted_lru": self.evicted_lru,
+            "evicted_idle": self.evicted_idle,
+        }
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            cutoff = time.monotonic() - self.idle_ttl_seconds
+            for session in [s for s in self._sessions.values() if s.last_used < cutoff and not s.lock.locked()]:
+                self._sessions.pop(session.id, None)
+                self.evicted_idle += 1
+                await session.close()
+
+
+def error_lines(output: str) -> list[str]:
+    return ERROR_LINE.findall(output)
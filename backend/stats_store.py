@@ -0,0 +1,270 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import date, datetime
+
+from hyperloglog import HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_stats (
+    date TEXT PRIMARY KEY,
+    requests INTEGER NOT NULL,
+    sketch BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS construct_stats (
+    construct TEXT PRIMARY KEY,
+    cells INTEGER NOT NULL,
+    wall_seconds REAL NOT NULL,
+    cpu_seconds REAL NOT NULL,
+    max_wall_seconds REAL NOT NULL,
+    memory_growth_bytes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+UPSERT = """
+INSERT INTO daily_stats (date, requests, sketch) VALUES (?, ?, ?)
+ON CONFLICT (date) DO UPDATE SET
+    requests = requests + excluded.requests,
+    sketch = hll_merge(sketch, excluded.sketch)
+"""
+
+CONSTRUCT_UPSERT = """
+INSERT INTO construct_stats (construct, cells, wall_seconds, cpu_seconds, max_wall_seconds, memory_growth_bytes)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (construct) DO UPDATE SET
+    cells = cells + excluded.cells,
+    wall_seconds = wall_seconds + excluded.wall_seconds,
+    cpu_seconds = cpu_seconds + excluded.cpu_seconds,
+    max_wall_seconds = max(max_wall_seconds, excluded.max_wall_seconds),
+    memory_growth_bytes = memory_growth_bytes + excluded.memory_growth_bytes
+"""
+CONSTRUCT_FIELDS = ("cells", "wall_seconds", "cpu_seconds", "max_wall_seconds", "memory_growth_bytes")
+
+
+def merge_construct(a: list, b: list) -> list:
+    return [a[0] + b[0], a[1] + b[1], a[2] + b[2], max(a[3], b[3]), a[4] + b[4]]
+
+
+def load_sketch(value) -> HyperLogLog:
+    # Files written before sketches existed store the raw IP list
+    return HyperLogLog.of(value) if isinstance(value, list) else HyperLogLog.loads(value)
+
+
+def merge_registers(a: bytes, b: bytes) -> bytes:
+    return bytes(map(max, a, b))
+
+
+def rollup_key(date_str: str, rollup: str) -> str:
+    if rollup == 'week':
+        year, week, _ = date.fromisoformat(date_str).isocalendar()
+        return f"{year}-W{week:02d}"
+    if rollup == 'month':
+        return date_str[:7]
+    return date_str
+
+
+class StatsStore:
+    """
+    Request counters shared by every worker process through one SQLite database in WAL mode.
+
+    Each worker counts in memory and a background flush merges its deltas in a single
+    transaction: request counts are added and HyperLogLog registers are max-merged, so
+    the totals are exact across any number of workers and `/admin/stats` gives the same
+    answer whichever worker serves it. Unique visitors stay sketches, no IP is stored.
+
+    `legacy_files` are the stats.json / stats_history.jsonl written by earlier versions;
+    they are imported once, by whichever worker gets there first, and renamed to *.imported.
+
+    Profiled cells are summed per construct the same way, for the slowest-constructs view.
+    """
+
+    def __init__(self, db_file: str, flush_interval: float, legacy_files: tuple[str, ...] = ()):
+        self.db_file = db_file
+        self.flush_interval = flush_interval
+        self.legacy_files = legacy_files
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        self._requests: dict[str, int] = {}
+        self._users: dict[str, HyperLogLog] = {}
+        self._constructs: dict[str, list] = {}
+        self._flush_task: asyncio.Task | None = None
+
+    def record(self, date_str: str, ip: str):
+        with self._lock:
+            self._requests[date_str] = self._requests.get(date_str, 0) + 1
+            if date_str not in self._users:
+                self._users[date_str] = HyperLogLog()
+            self._users[date_str].add(ip)
+
+    def record_cell(self, construct: str, wall_seconds: float, cpu_seconds: float, memory_growth_bytes: int):
+        delta = [1, wall_seconds, cpu_seconds, wall_seconds, memory_growth_bytes]
+        with self._lock:
+            current = self._constructs.get(construct)
+            self._constructs[construct] = merge_construct(current, delta) if current else delta
+
+    def slowest_constructs(self, limit: int = 20) -> list[dict]:
+        """Constructs by total wall time across all workers, with per-cell averages"""
+        with self._db_lock:
+            rows = self._connect().execute(
+                f"SELECT construct, {', '.join(CONSTRUCT_FIELDS)} FROM construct_stats").fetchall()
+        totals = {row[0]: list(row[1:]) for row in rows}
+        with self._lock:
+            for construct, delta in self._constructs.items():
+                totals[construct] = merge_construct(totals[construct], delta) if construct in totals else delta
+        ranked = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return [
+            {"construct": construct, **dict(zip(CONSTRUCT_FIELDS, values)),
+             "mean_wall_seconds": values[1] / values[0], "mean_cpu_seconds": values[2] / values[0]}
+            for construct, values in ranked
+        ]
+
+    def snapshot(self, start: str | None = None, end: str | None = None, rollup: str = 'day') -> dict:
+        """Estimated counts per day, ISO week or month across all workers, optionally limited to [start, end]"""
+        with self._db_lock:
+            rows = self._connect().execute(
+                "SELECT date, requests, sketch FROM daily_stats WHERE date >= ? AND date <= ?",
+                (start or '', end or '9999'),
+            ).fetchall()
+        requests = {d: count for d, count, _ in rows}
+        sketches = {d: HyperLogLog(registers=bytearray(sketch)) for d, _, sketch in rows}
+        # This worker's unflushed counts, so its own recent requests are never missing
+        with self._lock:
+            for date_str, count in self._requests.items():
+                requests[date_str] = requests.get(date_str, 0) + count
+                sketch = self._users[date_str]
+                sketches[date_str] = sketches[date_str].merge(sketch) if date_str in sketches else sketch
+
+        requests_per_period: dict[str, int] = {}
+        users_per_period: dict[str, HyperLogLog] = {}
+        total_users = HyperLogLog()
+        for date_str in sorted(requests):
+            if (start and date_str < start) or (end and date_str > end):
+                continue
+            key = rollup_key(date_str, rollup)
+            requests_per_period[key] = requests_per_period.get(key, 0) + requests[date_str]
+            if date_str in sketches:
+                sketch = sketches[date_str]
+                users_per_period[key] = users_per_period[key].merge(sketch) if key in users_per_period else sketch
+                total_users = total_users.merge(sketch)
+
+        return {
+            f'requests_per_{rollup}': requests_per_period,
+            f'unique_users_per_{rollup}': {k: v.count() for k, v in users_per_period.items()},
+            'unique_users_total': total_users.count(),
+        }
+
+    def load(self):
+        with self._db_lock:
+            db = self._connect()
+            db.executescript(SCHEMA)
+        if any(os.path.exists(path) for path in self.legacy_files):
+            try:
+                self._import_legacy()
+            except Exception as e:
+                logger.error(f"Failed to import legacy stats files {self.legacy_files}: {e}")
+
+    async def start(self):
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+        await asyncio.to_thread(self.flush)
+
+    def flush(self):
+        with self._lock:
+            if not self._requests and not self._constructs:
+                return
+            requests, self._requests = self._requests, {}
+            users, self._users = self._users, {}
+            constructs, self._constructs = self._constructs, {}
+
+        rows = [(d, count, bytes(users[d].registers)) for d, count in requests.items()]
+        construct_rows = [(construct, *values) for construct, values in constructs.items()]
+        try:
+            with self._db_lock:
+                self._write(rows, construct_rows)
+        except Exception as e:
+            logger.error(f"Failed to save stats to {self.db_file}: {e}")
+            # Put the deltas back so the next flush retries them
+            with self._lock:
+                for d, count in requests.items():
+                    self._requests[d] = self._requests.get(d, 0) + count
+                    self._users[d] = self._users[d].merge(users[d]) if d in self._users else users[d]
+                for construct, values in constructs.items():
+                    current = self._constructs.get(construct)
+                    self._constructs[construct] = merge_construct(current, values) if current else values
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            # Autocommit mode; writes open their own BEGIN IMMEDIATE transaction
+            db = sqlite3.connect(self.db_file, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.create_function("hll_merge", 2, merge_registers, deterministic=True)
+            self._db = db
+        return self._db
+
+    def _write(self, rows: list[tuple], construct_rows: list[tuple] = ()):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(UPSERT, rows)
+            db.executemany(CONSTRUCT_UPSERT, construct_rows)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _import_legacy(self):
+        requests: dict[str, int] = {}
+        sketches: dict[str, HyperLogLog] = {}
+        # History first: a day in both files was compacted before a crash and the history copy is final
+        for path in sorted(self.legacy_files, key=lambda p: not p.endswith('.jsonl')):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r') as f:
+                if path.endswith('.jsonl'):
+                    days = [json.loads(line) for line in f if line.strip()]
+                    days = [(d['date'], d['requests'], d.get('sketch', d.get('unique_users', []))) for d in days]
+                else:
+                    data = json.load(f)
+                    users = data.get('unique_users_per_day', {})
+                    days = [(d, count, users.get(d, [])) for d, count in data.get('requests_per_day', {}).items()]
+            for date_str, count, users in days:
+                if date_str not in requests:
+                    requests[date_str] = count
+                    sketches[date_str] = load_sketch(users)
+
+        with self._db_lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if db.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+                    db.execute("ROLLBACK")
+                    return
+                db.executemany(UPSERT, [(d, c, bytes(sketches[d].registers)) for d, c in requests.items()])
+                db.execute("INSERT INTO meta (key, value) VALUES ('legacy_imported', ?)", (datetime.utcnow().isoformat(),))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        for path in self.legacy_files:
+            if os.path.exists(path):
+                os.replace(path, f"{path}.imported")
+        logger.info(f"Imported {len(requests)} days of stats from {', '.join(self.legacy_files)} into {self.db_file}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.to_thread(self.flush)
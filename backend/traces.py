@@ -0,0 +1,89 @@
+import asyncio
+import hashlib
+import json
+import logging
+import secrets
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class TraceRecorder:
+    """
+    Appends one anonymized JSON line per /execute request to `trace_file`: keyed hashes
+    of the code and the client (equal input, equal hash, but neither can be read back),
+    the code size, arrival time, end-to-end latency, M2 wall and CPU seconds, output
+    size and outcome. Nothing is recorded when `trace_file` is empty, or without a
+    `hash_key`: unkeyed, a client hash is reversed by hashing every IPv4 address. Lines
+    are buffered and written every `flush_interval` seconds in one append, so several
+    workers can share the file.
+    """
+
+    def __init__(self, trace_file: str, flush_interval: float, hash_key: str = ""):
+        if trace_file and not hash_key:
+            logger.error("Not recording traces: M2_TRACE_FILE is set but M2_TRACE_HASH_KEY is not, "
+                         "and without a key the hashed client addresses could be recovered")
+            trace_file = ""
+        self.trace_file = trace_file
+        self.flush_interval = flush_interval
+        # Without a configured key, hashes are only comparable within this process
+        self.hash_key = hash_key.encode('utf-8') or secrets.token_bytes(32)
+        self._lines: list[str] = []
+        self._lock = threading.Lock()
+        self._flush_task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.trace_file)
+
+    def anonymize(self, value: str, digest_size: int = 16) -> str:
+        return hashlib.blake2b(value.encode('utf-8'), digest_size=digest_size, key=self.hash_key).hexdigest()
+
+    def record(self, code: str, client: str, arrival: float, outcome: str, latency_seconds: float,
+               wall_seconds: float = 0.0, cpu_seconds: float = 0.0, output_bytes: int = 0):
+        if not self.enabled:
+            return
+        trace = {
+            "arrival": round(arrival, 6),
+            "code_hash": self.anonymize(code),
+            "client": self.anonymize(client, 8),
+            "code_bytes": len(code.encode('utf-8')),
+            "latency_seconds": round(latency_seconds, 6),
+            "wall_seconds": round(wall_seconds, 6),
+            "cpu_seconds": round(cpu_seconds, 6),
+            "output_bytes": output_bytes,
+            "outcome": outcome,
+        }
+        with self._lock:
+            self._lines.append(json.dumps(trace) + "\n")
+
+    async def start(self):
+        if self.enabled:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+        await asyncio.to_thread(self.flush)
+
+    def flush(self):
+        with self._lock:
+            lines, self._lines = self._lines, []
+        if not lines:
+            return
+        try:
+            with open(self.trace_file, 'a', encoding='utf-8') as f:
+                f.write("".join(lines))
+        except OSError as e:
+            logger.error(f"Failed to write traces to {self.trace_file}: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.to_thread(self.flush)
+
+
+def load_traces(trace_file: str) -> list[dict]:
+    with open(trace_file, encoding='utf-8') as f:
+        traces = [json.loads(line) for line in f if line.strip()]
+    return sorted(traces, key=lambda trace: trace["arrival"])
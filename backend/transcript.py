@@ -0,0 +1,164 @@
+import re
+from dataclasses import dataclass, field
+
+PROMPT = re.compile(r'^i\d+ : ', re.MULTILINE)
+
+
+class PromptSplitter:
+    """Cuts M2 output into `iN :` blocks as text arrives, holding back the block still being printed"""
+
+    def __init__(self):
+        self._pending = ""
+        self._prompts: list[int] = []
+        self._scanned = 0
+
+    def feed(self, text: str) -> list[str]:
+        self._pending += text
+        # Only rescan from the last line start, a prompt may straddle two chunks
+        for match in PROMPT.finditer(self._pending, self._scanned):
+            if not self._prompts or match.start() > self._prompts[-1]:
+                self._prompts.append(match.start())
+        self._scanned = self._pending.rfind('\n') + 1
+
+        if not self._prompts or (len(self._prompts) == 1 and self._prompts[0] == 0):
+            return []
+        cuts = [0] + [start for start in self._prompts if start > 0]
+        blocks = [self._pending[a:b] for a, b in zip(cuts, cuts[1:])]
+        last = cuts[-1]
+        self._pending = self._pending[last:]
+        self._prompts = [0]
+        self._scanned = max(0, self._scanned - last)
+        return blocks
+
+    def flush(self) -> list[str]:
+        pending, self._pending = self._pending, ""
+        self._prompts = []
+        self._scanned = 0
+        return [pending] if pending else []
+
+
+INPUT = re.compile(r'^i(\d+) : (.*)$')
+ERROR = re.compile(r'^\S+:\d+:\d+:\(\d+\):\s*error:')
+
+
+@dataclass
+class Cell:
+    n: int
+    input: str
+    value: str | None = None
+    type: str | None = None
+    output: str = ""
+    errors: list[str] = field(default_factory=list)
+
+
+class TranscriptParser:
+    """
+    Single-pass, incremental parser of an M2 transcript into cells. Feed text as it
+    arrives and each call returns the cells it completed. Only the current line and
+    paragraph are buffered, so the cost is linear in the size of the output.
+
+    A cell is the `iN :` input with its continuation lines, the `oN =` paragraph as
+    the value and the `oN :` paragraph as the type (both with their 2D layout kept,
+    exponent lines included, prefix columns removed), and any other paragraph as
+    printed output or, for `file:line:col:(n): error:` lines, as errors.
+    """
+
+    def __init__(self):
+        self._partial: list[str] = []
+        self._cell: Cell | None = None
+        self._indent = 0
+        self._in_input = False
+        self._paragraph: list[str] = []
+
+    def feed(self, text: str) -> list[Cell]:
+        if '\n' not in text:
+            self._partial.append(text)
+            return []
+        lines = (''.join(self._partial) + text).split('\n')
+        self._partial = [lines.pop()]
+        done = []
+        for line in lines:
+            self._line(line, done)
+        return done
+
+    def finish(self, stderr_errors: list[str] = ()) -> list[Cell]:
+        """Flush the last cell; errors from stderr belong to it since `--stop` exits on the first one"""
+        done = []
+        if self._partial:
+            self._line(''.join(self._partial), done)
+            self._partial = []
+        self._close_cell(done)
+        if stderr_errors:
+            if done:
+                done[-1].errors.extend(stderr_errors)
+            else:
+                done.append(Cell(n=0, input="", errors=list(stderr_errors)))
+        return done
+
+    def _line(self, line: str, done: list[Cell]):
+        match = INPUT.match(line)
+        if match:
+            self._close_cell(done)
+            self._cell = Cell(n=int(match[1]), input=match[2])
+            self._indent = match.start(2)
+            self._in_input = True
+            return
+        if self._cell is None:
+            return
+        if self._in_input:
+            if line.strip() and line.startswith(' ' * self._indent):
+                self._cell.input += '\n' + line[self._indent:]
+                return
+            self._in_input = False
+        if line.strip():
+            self._paragraph.append(line)
+        else:
+            self._end_paragraph()
+
+    def _close_cell(self, done: list[Cell]):
+        self._end_paragraph()
+        # The `exit` appended to every run is not part of the user's code
+        if self._cell and self._cell.input.strip() != 'exit':
+            done.append(self._cell)
+        self._cell = None
+
+    def _end_paragraph(self):
+        if not self._paragraph:
+            return
+        lines, self._paragraph = self._paragraph, []
+        cell = self._cell
+        value_prefix, type_prefix = f"o{cell.n} = ", f"o{cell.n} : "
+        # Both can have exponent lines above the prefixed one, indented by the prefix's width
+        if any(line.startswith(type_prefix) for line in lines):
+            cell.type = '\n'.join(line[len(type_prefix):] for line in lines)
+        elif any(line.startswith(value_prefix) for line in lines):
+            cell.value = '\n'.join(line[len(value_prefix):] for line in lines)
+        else:
+            for line in lines:
+                if ERROR.match(line):
+                    cell.errors.append(line)
+                else:
+                    cell.output += line + '\n'
+
+
+def parse_transcript(stdout: str, stderr_errors: list[str] = ()) -> list[Cell]:
+    parser = TranscriptParser()
+    return parser.feed(stdout) + parser.finish(stderr_errors)
+
+
+def stderr_error_lines(stderr: str) -> list[str]:
+    """Lines of M2 stderr left after dropping the version banner and the package list"""
+    error_lines = []
+    in_packages = False
+    for line in stderr.strip().split('\n'):
+        if 'with packages:' in line:
+            in_packages = True
+            continue
+        elif in_packages:
+            # Skip package list line(s) - they don't start with known prefixes
+            if line.strip() and not any(line.strip().startswith(prefix) for prefix in ['stdio:', 'error:', '--']):
+                continue
+            in_packages = False
+        if line.strip() and not line.startswith('Macaulay2, version'):
+            error_lines.append(line)
+    return error_lines
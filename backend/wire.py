@@ -0,0 +1,119 @@
+import asyncio
+import gzip
+
+from starlette.datastructures import Headers, MutableHeaders
+
+# Both are optional: without them responses fall back to gzip and JSON
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+# Compressing more than this at once would hold up the event loop
+INLINE_COMPRESS_MAX_BYTES = 256_000
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    encodings = set()
+    for part in accept_encoding.lower().split(','):
+        name, _, params = part.partition(';')
+        q = params.strip().removeprefix('q=')
+        try:
+            if params and float(q) <= 0:
+                continue
+        except ValueError:
+            continue
+        encodings.add(name.strip())
+    return encodings
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """zstd when both sides have it, else gzip, else None"""
+    accepted = accepted_encodings(accept_encoding)
+    if zstandard and ("zstd" in accepted or "*" in accepted):
+        return "zstd"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least `minimum_size` bytes with zstd or gzip, whichever
+    the client accepts. Only responses with a Content-Length are compressed; streamed
+    ones (SSE) pass through untouched, so events still reach the client as they happen.
+    """
+
+    def __init__(self, app, minimum_size: int):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", "")) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        chunks = []
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if (int(headers.get("content-length", 0)) >= self.minimum_size and "content-encoding" not in headers
+                        and not headers.get("content-type", "").startswith("text/event-stream")):
+                    start = message
+                    return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body"):
+                return
+            body = b"".join(chunks)
+            if len(body) > INLINE_COMPRESS_MAX_BYTES:
+                body = await asyncio.to_thread(compress, body, encoding)
+            else:
+                body = compress(body, encoding)
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def wants_msgpack(accept: str) -> bool:
+    return msgpack is not None and any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+
+def compact_response(response: dict) -> dict:
+    """
+    The response without empty fields and repeats: when there is an error_message, the
+    stderr it was taken from is left out, as beyond those lines it only holds the banner.
+    """
+    fields = {key: value for key, value in response.items()
+              if key == "success" or value not in (None, False, "", [])}
+    if "error_message" in fields:
+        fields.pop("stderr", None)
+    return fields
+
+
+def pack_msgpack(response: dict) -> bytes:
+    return msgpack.packb(compact_response(response))
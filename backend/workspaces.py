@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+def directory_bytes(path: str) -> int:
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(directory, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+def wipe(path: str) -> bool:
+    """Empty a workspace but keep the directory itself; False when something could not be removed"""
+    for entry in os.scandir(path):
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return False
+    return True
+
+
+def remove(path: str):
+    if os.path.ismount(path):
+        subprocess.run(["umount", path], capture_output=True)
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def memory_backed(path: str) -> bool:
+    """Whether `path`, or the nearest existing directory above it, is on tmpfs or ramfs"""
+    path = os.path.realpath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    mount_point, fstype = "", ""
+    try:
+        with open("/proc/mounts") as f:
+            for line in f:
+                fields = line.split()
+                point = fields[1].replace("\\040", " ")
+                if (path == point or path.startswith(point.rstrip("/") + "/")) and len(point) >= len(mount_point):
+                    mount_point, fstype = point, fields[2]
+    except (OSError, IndexError):
+        return False
+    return fstype in ("tmpfs", "ramfs")
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class WorkspaceManager:
+    """
+    A ring of scratch directories M2 runs in, created once under `root` (ideally a
+    tmpfs such as /dev/shm) instead of a new temporary directory per run. A released
+    workspace is emptied in the background and goes back to the ring; when the ring is
+    empty an extra directory is made and removed afterwards.
+
+    Each worker process keeps its workspaces in `root/<pid>`. The reaper removes the
+    directories of processes that are gone and any of its own it no longer tracks.
+    When the service may mount, every workspace is its own tmpfs of `quota_bytes`.
+    Otherwise the quota is only checked on release (RLIMIT_FSIZE still caps each file),
+    so a memory-backed `root` is swapped for `fallback_root` on disk: files there
+    would use RAM that no limit of the M2 process covers.
+    """
+
+    def __init__(self, root: str, slots: int, quota_bytes: int, reap_interval: float,
+                 fallback_root: str = os.path.join(tempfile.gettempdir(), "m2-workspaces")):
+        self.root = root
+        self.fallback_root = fallback_root
+        self.slots = slots
+        self.quota_bytes = quota_bytes
+        self.reap_interval = reap_interval
+        self.directory = os.path.join(root, str(os.getpid()))
+        self.mounted = False
+        self._free: list[str] = []
+        self._ring: set[str] = set()
+        self._active: set[str] = set()
+        self._recycling: set[asyncio.Task] = set()
+        self._reap_task: asyncio.Task | None = None
+        self.extra_created = 0
+        self.over_quota = 0
+
+    async def start(self):
+        await asyncio.to_thread(self._create_ring)
+        await asyncio.to_thread(self.reap)
+        self._reap_task = asyncio.create_task(self._reap_loop())
+
+    async def stop(self):
+        if self._reap_task:
+            self._reap_task.cancel()
+        await asyncio.gather(*self._recycling, return_exceptions=True)
+        await asyncio.to_thread(self._remove_all)
+
+    def acquire(self) -> str:
+        if self._free:
+            path = self._free.pop()
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            path = tempfile.mkdtemp(prefix="extra-", dir=self.directory)
+            if self.mounted:
+                self._mount(path)
+            self.extra_created += 1
+        self._active.add(path)
+        return path
+
+    def release(self, path: str):
+        """Hand a workspace back; it is emptied off the request path before anyone gets it again"""
+        task = asyncio.create_task(self._recycle(path))
+        self._recycling.add(task)
+        task.add_done_callback(self._recycling.discard)
+
+    def reap(self):
+        """Remove the directories of worker processes that are gone"""
+        if not os.path.isdir(self.root):
+            return
+        for entry in os.scandir(self.root):
+            if entry.name.isdigit() and entry.path != self.directory and not pid_alive(int(entry.name)):
+                for leftover in os.scandir(entry.path):
+                    remove(leftover.path)
+                shutil.rmtree(entry.path, ignore_errors=True)
+                logger.info(f"Removed workspaces left behind by process {entry.name}")
+
+    def stats(self) -> dict:
+        return {
+            "root": self.root,
+            "slots": len(self._ring),
+            "free": len(self._free),
+            "in_use": len(self._active),
+            "tmpfs_per_workspace": self.mounted,
+            "quota_bytes": self.quota_bytes,
+            "extra_created": self.extra_created,
+            "over_quota": self.over_quota,
+        }
+
+    def _create_ring(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if self.slots:
+            first = os.path.join(self.directory, "slot-0")
+            os.makedirs(first, exist_ok=True)
+            self.mounted = self._mount(first)
+            if not self.mounted and memory_backed(self.root):
+                logger.warning(f"Cannot mount a tmpfs per workspace, using {self.fallback_root} instead of "
+                               f"{self.root} so workspace files do not take unlimited RAM")
+                shutil.rmtree(self.directory, ignore_errors=True)
+                self.root = self.fallback_root
+                self.directory = os.path.join(self.root, str(os.getpid()))
+                os.makedirs(self.directory, exist_ok=True)
+        for i in range(self.slots):
+            path = os.path.join(self.directory, f"slot-{i}")
+            os.makedirs(path, exist_ok=True)
+            if i > 0 and self.mounted:
+                self.mounted = self._mount(path)
+            self._ring.add(path)
+            self._free.append(path)
+        if self.slots:
+            logger.info(f"{self.slots} workspaces under {self.directory}"
+                        f"{', each a tmpfs' if self.mounted else ''}")
+
+    def _mount(self, path: str) -> bool:
+        result = subprocess.run(
+            ["mount", "-t", "tmpfs", "-o", f"size={self.quota_bytes},mode=0700", "tmpfs", path],
+            capture_output=True,
+        )
+        return result.returncode == 0
+
+    async def _recycle(self, path: str):
+        self._active.discard(path)
+        if path not in self._ring:
+            await asyncio.to_thread(remove, path)
+            return
+        if not self.mounted and await asyncio.to_thread(directory_bytes, path) > self.quota_bytes:
+            self.over_quota += 1
+            logger.warning(f"Workspace {path} went over its {self.quota_bytes} byte quota")
+        if await asyncio.to_thread(wipe, path):
+            self._free.append(path)
+        else:
+            # Leave it to the reaper and run with one workspace less until then
+            self._ring.discard(path)
+            logger.warning(f"Could not empty workspace {path}, taking it out of the ring")
+
+    def _remove_all(self):
+        for path in self._ring | self._active:
+            remove(path)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    async def _reap_untracked(self):
+        if not os.path.isdir(self.directory):
+            return
+        names = await asyncio.to_thread(os.listdir, self.directory)
+        # Compared here on the event loop, so a workspace acquired meanwhile is already tracked
+        known = self._ring | self._active
+        for path in [os.path.join(self.directory, name) for name in names]:
+            if path not in known:
+                await asyncio.to_thread(remove, path)
+
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await asyncio.to_thread(self.reap)
+                await self._reap_untracked()
+            except Exception as e:
+                logger.error(f"Failed to reap workspaces: {e}")
+
+
+# Until the backend configures a ring, every run gets its own directory in the system temp dir
+_manager = WorkspaceManager(os.path.join(tempfile.gettempdir(), "m2-workspaces"), slots=0,
+                            quota_bytes=100_000_000, reap_interval=60)
+
+
+def use_workspaces(manager: WorkspaceManager):
+    global _manager
+    _manager = manager
+
+
+def acquire_workspace() -> str:
+    return _manager.acquire()
+
+
+def release_workspace(path: str):
+    _manager.release(path)
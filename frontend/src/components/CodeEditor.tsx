@@ -2,7 +2,7 @@ import { useState, useRef, useEffect } from 'react';
 import Editor from '@monaco-editor/react';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
-import { executeCode, ApiError } from '@/lib/api';
+import { executeCode, getOutputPage, ApiError } from '@/lib/api';
 import { Play, Loader2, Terminal } from 'lucide-react';
 
 export function CodeEditor() {
@@ -10,6 +10,11 @@ export function CodeEditor() {
   const [output, setOutput] = useState('');
   const [error, setError] = useState('');
   const [isExecuting, setIsExecuting] = useState(false);
+  // A large output is only inlined up to a line break; the rest is paged in from outputHandle
+  const [outputHandle, setOutputHandle] = useState<string | null>(null);
+  const [outputBytes, setOutputBytes] = useState(0);
+  const [nextLine, setNextLine] = useState<number | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const outputRef = useRef<HTMLPreElement>(null);
 
   useEffect(() => {
@@ -27,10 +32,18 @@ export function CodeEditor() {
     setIsExecuting(true);
     setOutput('');
     setError('');
+    setOutputHandle(null);
+    setNextLine(null);
 
     try {
       const result = await executeCode(code);
-      
+
+      if (result.output_handle) {
+        setOutputHandle(result.output_handle);
+        setOutputBytes(result.output_bytes || 0);
+        // Pages are read by line, which only lines up when the head ends at a line break
+        setNextLine(result.stdout.endsWith('\n') ? result.stdout.split('\n').length - 1 : null);
+      }
       if (result.success) {
         setOutput(result.stdout || '(No output)');
         if (result.stderr) {
@@ -51,6 +64,24 @@ export function CodeEditor() {
     }
   };
 
+  const handleLoadMore = async () => {
+    if (!outputHandle || nextLine === null) {
+      return;
+    }
+
+    setIsLoadingMore(true);
+    try {
+      const page = await getOutputPage(outputHandle, nextLine);
+      setOutput((previous) => previous + page.text);
+      setNextLine(page.next_line);
+    } catch (err) {
+      setError(err instanceof ApiError ? err.message : 'Failed to load more output');
+      setNextLine(null);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   return (
     <div className="container mx-auto p-4 max-w-6xl">
       <div className="mb-6">
@@ -156,6 +187,20 @@ export function CodeEditor() {
                 </pre>
               )}
 
+              {/* Rest of a large output */}
+              {outputHandle && nextLine !== null && !isExecuting && (
+                <Button variant="outline" onClick={handleLoadMore} disabled={isLoadingMore} className="w-full">
+                  {isLoadingMore ? (
+                    <>
+                      <Loader2 className="mr-2 h-4 w-4 animate-spin" />
+                      Loading...
+                    </>
+                  ) : (
+                    `Load more (${new TextEncoder().encode(output).length.toLocaleString()} of ${outputBytes.toLocaleString()} bytes shown)`
+                  )}
+                </Button>
+              )}
+
               {/* Error Output */}
               {error && (
                 <div>
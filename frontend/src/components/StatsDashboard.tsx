@@ -58,7 +58,7 @@ export function StatsDashboard() {
                   <div key={date} className="flex justify-between border-b border-border pb-2">
                     <span>{date}</span>
                     <span className="font-mono">
-                      {stats.unique_users_per_day[date]?.length || 0}
+                      {stats.unique_users_per_day[date] ?? 0}
                     </span>
                   </div>
                 ))
@@ -3,6 +3,17 @@ const API_BASE_URL = import.meta.env.VITE_API_URL || '/dev/api';
 
 export interface CodeExecutionRequest {
   code: string;
+  format?: 'text' | 'cells';
+  profile?: boolean;
+}
+
+export interface TranscriptCell {
+  n: number;
+  input: string;
+  value: string | null;
+  type: string | null;
+  output: string;
+  errors: string[];
 }
 
 export interface CodeExecutionResponse {
@@ -10,6 +21,39 @@ export interface CodeExecutionResponse {
   stderr: string;
   success: boolean;
   error_message?: string | null;
+  cached?: boolean;
+  cells?: TranscriptCell[] | null;
+  output_handle?: string | null;
+  output_bytes?: number | null;
+  output_truncated?: boolean;
+  syntax_error?: string | null;
+  profile?: ProfileReport | null;
+  throttled?: boolean;
+}
+
+export interface CellProfile {
+  n: number;
+  input: string;
+  kind: string;
+  wall_seconds: number;
+  cpu_seconds: number | null;
+  memory_growth_bytes: number | null;
+  complete: boolean;
+}
+
+export interface ProfileReport {
+  cells: CellProfile[];
+  wall_seconds: number;
+  cpu_seconds: number;
+  peak_rss_bytes: number;
+}
+
+export interface OutputPage {
+  handle: string;
+  text: string;
+  total_bytes: number;
+  next_offset: number | null;
+  next_line: number | null;
 }
 
 export class ApiError extends Error {
@@ -57,6 +101,14 @@ export async function executeCode(code: string): Promise<CodeExecutionResponse>
   }
 }
 
+export async function getOutputPage(handle: string, line: number): Promise<OutputPage> {
+  const response = await fetch(`${API_BASE_URL}/outputs/${encodeURIComponent(handle)}?line=${line}`);
+  if (!response.ok) {
+    throw new ApiError('Output is no longer available', response.status);
+  }
+  return await response.json();
+}
+
 export async function checkHealth(): Promise<{ status: string }> {
   const response = await fetch(`${API_BASE_URL}/health`);
   if (!response.ok) {
@@ -67,7 +119,8 @@ export async function checkHealth(): Promise<{ status: string }> {
 
 export interface StatsResponse {
   requests_per_day: Record<string, number>;
-  unique_users_per_day: Record<string, string[]>;
+  unique_users_per_day: Record<string, number>;
+  unique_users_total: number;
 }
 
 export async function getStats(): Promise<StatsResponse> {